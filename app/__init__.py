@@ -1,3 +1,6 @@
+import os
+import time
+
 from flask import Flask
 from .extensions import db, migrate, login_manager
 from .config import Config
@@ -6,11 +9,16 @@ from .routes.post import post
 from .routes.teacher import teacher
 from .routes.course import course_bp
 from .routes.sandbox import sandbox_bp
+from .commands import register_commands
+from .services.pagination import page_url
+from .services.images import image_info
+from .services import assets, compression, fragment_cache
 from dotenv import load_dotenv
 
 load_dotenv()
 
 def create_app(config_class = Config):
+    started = time.perf_counter()
     app = Flask(__name__)
     app.config.from_object(config_class)
 
@@ -23,12 +31,31 @@ def create_app(config_class = Config):
     db.init_app(app)
     migrate.init_app(app, db)
     login_manager.init_app(app)
+    register_commands(app)
+    app.add_template_global(page_url)
+    app.add_template_global(image_info)
+    assets.init_app(app, _flag(app, "ASSETS_MANIFEST", True))
+    compression.init_app(app, _flag(app, "COMPRESS_ENABLED", True))
+    fragment_cache.init_app(app, _flag(app, "FRAGMENT_CACHE_ENABLED", True))
 
     login_manager.login_view = 'user.login'
     login_manager.login_message = 'Пожалуйста, войдите для доступа к этой странице'
     login_manager.login_message_category = 'info'
 
-    with app.app_context():
-        db.create_all()
+    # в контейнере схему ведут миграции (flask db upgrade) — DB_CREATE_ALL=0
+    if _flag(app, "DB_CREATE_ALL", True):
+        with app.app_context():
+            db.create_all()
+
+    # время импортов видно в логе gunicorn (gunicorn ready in ...)
+    app.logger.info("app ready: create_app %.0f ms", (time.perf_counter() - started) * 1000)
+    return app
+
 
-    return app
\ No newline at end of file
+def _flag(app, key, default):
+    value = app.config.get(key, os.getenv(key))
+    if value is None:
+        return default
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return bool(value)
\ No newline at end of file
@@ -0,0 +1,170 @@
+"""Сборка статики: отпечатки содержимого, минификация, .gz/.br рядом.
+
+    python build_assets.py [--static DIR] [--clean]
+
+Из css/, js/ и img/ в static собираются копии в static/dist/ с хешем
+содержимого в имени (css/style.css -> dist/css/style.1a2b3c4d.css) и
+static/dist/manifest.json «исходный путь -> собранный». Приложение по
+манифесту подменяет filename в url_for('static', ...) (services/assets.py),
+поэтому шаблоны менять не нужно. Имя меняется вместе с содержимым —
+nginx отдаёт dist/ с Cache-Control: immutable на год, а готовые .gz/.br
+через gzip_static без сжатия на лету.
+
+CSS минифицируется rcssmin, JS — rjsmin, если они установлены; без rcssmin
+работает простой встроенный минификатор, JS без rjsmin не трогается.
+Brotli-копии пишутся, если установлен пакет brotli.
+
+Скрипт не импортирует приложение: в Docker он запускается до старта
+gunicorn. Старые сборки по умолчанию не удаляются — у клиентов могут быть
+открыты страницы со старыми ссылками; --clean убирает всё, чего нет в
+новом манифесте.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+
+
+SOURCES = ("css", "js", "img")
+COMPRESS = {".css", ".js", ".svg", ".json", ".txt"}
+# сжатая копия, которая почти не меньше оригинала, только тратит место
+MIN_SAVING = 0.9
+DIST = "dist"
+MANIFEST = "manifest.json"
+
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+_CSS_COMMENT = re.compile(r"/\*.*?\*/", re.S)
+_CSS_STRING = re.compile(r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')""")
+_CSS_SPACE = re.compile(r"\s+")
+_CSS_PUNCT = re.compile(r"\s*([{};,>])\s*")
+
+
+def _minify_css_simple(text: str) -> str:
+    # строки не трогаем: внутри них пробелы и «/*» значимы
+    parts = _CSS_STRING.split(text)
+    out = []
+    for i, part in enumerate(parts):
+        if i % 2:
+            out.append(part)
+            continue
+        part = _CSS_COMMENT.sub("", part)
+        part = _CSS_SPACE.sub(" ", part)
+        part = _CSS_PUNCT.sub(r"\1", part)
+        part = part.replace(";}", "}")
+        out.append(part)
+    return "".join(out).strip()
+
+
+def minify(ext: str, data: bytes) -> bytes:
+    if ext == ".css":
+        text = data.decode("utf-8")
+        text = rcssmin.cssmin(text) if rcssmin else _minify_css_simple(text)
+        return text.encode("utf-8")
+    if ext == ".js" and rjsmin:
+        return rjsmin.jsmin(data.decode("utf-8")).encode("utf-8")
+    return data
+
+
+def _write(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _compressed(target: str, data: bytes) -> list:
+    written = []
+    packed = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(packed) < len(data) * MIN_SAVING:
+        _write(target + ".gz", packed)
+        written.append(target + ".gz")
+    if brotli is not None:
+        packed = brotli.compress(data, quality=11)
+        if len(packed) < len(data) * MIN_SAVING:
+            _write(target + ".br", packed)
+            written.append(target + ".br")
+    return written
+
+
+def _sources(static: str):
+    for top in SOURCES:
+        root = os.path.join(static, top)
+        for folder, _, files in os.walk(root):
+            for name in sorted(files):
+                # «файл:Zone.Identifier» и прочий мусор с Windows
+                if ":" in name or name.startswith("."):
+                    continue
+                path = os.path.join(folder, name)
+                yield os.path.relpath(path, static).replace(os.sep, "/"), path
+
+
+def build(static: str, clean: bool = False, log=print) -> dict:
+    """Собрать dist/ и manifest.json в static; вернуть манифест."""
+    dist = os.path.join(static, DIST)
+    manifest = {}
+    keep = {os.path.join(dist, MANIFEST)}
+    before = after = 0
+
+    for logical, source in _sources(static):
+        with open(source, "rb") as f:
+            raw = f.read()
+        stem, ext = os.path.splitext(logical)
+        data = minify(ext.lower(), raw)
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        built = f"{DIST}/{stem}.{digest}{ext}"
+        target = os.path.join(static, *built.split("/"))
+
+        if not os.path.exists(target):
+            _write(target, data)
+        keep.add(target)
+        if ext.lower() in COMPRESS:
+            keep.update(_compressed(target, data))
+        manifest[logical] = built
+
+        if ext.lower() in COMPRESS:
+            best = min([len(data)] + [os.path.getsize(p) for p in (target + ".br", target + ".gz") if p in keep])
+            before += len(raw)
+            after += best
+            log(f"{logical} -> {built}  {len(raw)} -> {len(data)} min, {best} compressed")
+
+    _write(os.path.join(dist, MANIFEST), json.dumps(manifest, indent=1, sort_keys=True).encode("utf-8"))
+    log(f"{len(manifest)} files, text assets {before} -> {after} bytes")
+
+    if clean:
+        for folder, _, files in os.walk(dist):
+            for name in files:
+                path = os.path.join(folder, name)
+                if path not in keep:
+                    os.remove(path)
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--static", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "static"))
+    parser.add_argument("--clean", action="store_true", help="Удалить из dist всё, чего нет в новом манифесте.")
+    args = parser.parse_args(argv)
+    build(args.static, clean=args.clean)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from .services.progress import rebuild_all
+from .services.lab_provisioning import warm_targets, fill_pool
+from .services.lab_catalog import sync_catalog
+from .services.sandbox_client import SandboxError
+from .services.query_plans import check_plans
+from .services.images import process_existing, collect_garbage
+from .build_assets import build as build_assets
+from .services.lesson_html import rerender
+
+
+progress_cli = AppGroup("progress", help="Денормализованный прогресс студентов.")
+
+
+@progress_cli.command("rebuild")
+@click.option("--course-id", type=int, default=None, help="Только этот курс (по умолчанию — все).")
+def rebuild_progress(course_id):
+    """Заполнить/пересобрать lesson_result и course_progress из сырых попыток."""
+    total = 0
+    for cid, students in rebuild_all(course_id):
+        click.echo(f"course {cid}: {students} students")
+        total += students
+    click.echo(f"done, {total} progress rows")
+
+
+labs_cli = AppGroup("labs", help="Лабораторные и песочницы.")
+
+
+@labs_cli.command("warm")
+def warm_pools():
+    """Заполнить тёплые пулы песочниц для всех лаб из уроков (для cron/деплоя)."""
+    targets = warm_targets()
+    if not targets:
+        click.echo("warm pool disabled or no lab lessons")
+        return
+    for slug, size in sorted(targets.items()):
+        created = fill_pool(slug, size)
+        click.echo(f"{slug}: +{created} (target {size})")
+
+
+@labs_cli.command("sync")
+def sync_labs():
+    """Обновить LabDefinition из каталога sandbox-manager (для cron)."""
+    try:
+        result = sync_catalog()
+    except SandboxError as e:
+        raise click.ClickException(f"sandbox-manager недоступен: {e}")
+    click.echo("added {added}, updated {updated}, hidden {hidden}".format(**result))
+
+
+schema_cli = AppGroup("schema", help="Проверки схемы БД.")
+
+
+@schema_cli.command("explain")
+@click.option("--verbose", is_flag=True, help="Печатать планы целиком.")
+def explain_key_queries(verbose):
+    """EXPLAIN ключевых запросов; код выхода 1, если где-то полный проход по таблице."""
+    failed = 0
+    for result in check_plans():
+        status = "SEQ SCAN " + ", ".join(result.seq_scans) if result.seq_scans else "ok"
+        click.echo(f"{result.name}: {status}")
+        if verbose or result.seq_scans:
+            for line in result.plan:
+                click.echo(f"    {line}")
+        failed += bool(result.seq_scans)
+    if failed:
+        raise click.ClickException(f"{failed} queries fall back to sequential scans")
+
+
+images_cli = AppGroup("images", help="Загруженные картинки.")
+
+
+@images_cli.command("process")
+@click.option("--rebuild", is_flag=True, help="Пересобрать копии и у готовых картинок.")
+def process_images(rebuild):
+    """Перенести старые фото в хранилище по хешу и построить уменьшенные копии."""
+    for path, result in process_existing(rebuild):
+        click.echo(f"{path}: {result}")
+
+
+@images_cli.command("gc")
+@click.option("--grace", type=int, default=None, help="Не трогать картинки моложе стольких секунд.")
+def images_gc(grace):
+    """Удалить из хранилища картинки, на которые больше нет ссылок (для cron)."""
+    click.echo(f"removed {collect_garbage(grace)} images")
+
+
+assets_cli = AppGroup("assets", help="Сборка статики.")
+
+
+@assets_cli.command("build")
+@click.option("--clean", is_flag=True, help="Удалить из dist всё, чего нет в новом манифесте.")
+def build_static(clean):
+    """Собрать static/dist: отпечатки, минификация, .gz/.br (то же, что python build_assets.py)."""
+    build_assets(current_app.static_folder, clean=clean, log=click.echo)
+
+
+lessons_cli = AppGroup("lessons", help="Содержимое уроков.")
+
+
+@lessons_cli.command("render")
+@click.option("--all", "everything", is_flag=True, help="Перерисовать все уроки, а не только устаревшие.")
+def render_lessons(everything):
+    """Пересобрать rendered_html уроков после изменения обработки HTML."""
+    total = 0
+    for course_id, count in rerender(everything):
+        click.echo(f"course {course_id}: {count} lessons")
+        total += count
+    click.echo(f"done, {total} lessons")
+
+
+def register_commands(app):
+    app.cli.add_command(progress_cli)
+    app.cli.add_command(labs_cli)
+    app.cli.add_command(schema_cli)
+    app.cli.add_command(images_cli)
+    app.cli.add_command(assets_cli)
+    app.cli.add_command(lessons_cli)
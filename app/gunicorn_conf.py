@@ -0,0 +1,168 @@
+"""Конфигурация gunicorn для продакшена.
+
+    gunicorn -c gunicorn_conf.py wsgi:app
+
+Всё настраивается переменными окружения:
+
+    GUNICORN_WORKER_CLASS   sync | gthread | gevent (по умолчанию gthread)
+    GUNICORN_WORKERS        число процессов (WEB_CONCURRENCY — синоним);
+                            по умолчанию считается от числа CPU
+    GUNICORN_MAX_WORKERS    верхняя граница для авторасчёта (8)
+    GUNICORN_THREADS        потоков на процесс для gthread (4)
+    GUNICORN_CONNECTIONS    одновременных соединений на процесс для gevent (100)
+    GUNICORN_MAX_REQUESTS   перезапуск воркера после N запросов (1000, 0 — выкл.)
+    GUNICORN_MAX_REQUESTS_JITTER  разброс, чтобы воркеры не рестартовали разом (100)
+    GUNICORN_PRELOAD        загрузить приложение в мастере до fork (1); объекты
+                            мастера замораживаются gc.freeze() и делятся
+                            воркерами через copy-on-write
+    GUNICORN_TIMEOUT, GUNICORN_GRACEFUL_TIMEOUT, GUNICORN_KEEPALIVE
+    GUNICORN_SLOW_MS        запросы дольше этого пишутся в лог как warning (1000)
+
+Потокобезопасность под gthread проверена: кеши процесса (оглавление,
+тесты, флаги, каталог лаб, личности), предохранитель sandbox и счётчики
+хеширования паролей защищены блокировками; Session в Flask-SQLAlchemy
+своя у каждого потока; requests.Session клиента sandbox делит только
+пул соединений urllib3, который потокобезопасен. Пул БД по умолчанию
+(5 + 10 overflow) больше, чем потоки воркера плюс фоновые потоки
+провижининга лаб, а SANDBOX_POOL_SIZE должен быть не меньше GUNICORN_THREADS.
+"""
+import gc
+import multiprocessing
+import os
+import threading
+import time
+
+
+def _env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_bool(name, default):
+    value = os.getenv(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _cpu_count():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return multiprocessing.cpu_count()
+
+
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+if worker_class not in ("sync", "gthread", "gevent"):
+    raise RuntimeError(f"GUNICORN_WORKER_CLASS={worker_class!r}: ожидается sync, gthread или gevent")
+
+cpus = _cpu_count()
+max_workers = _env_int("GUNICORN_MAX_WORKERS", 8)
+
+if worker_class == "sync":
+    # процесс занят запросом целиком — нужен запас на ожидание БД и sandbox
+    default_workers = 2 * cpus + 1
+elif worker_class == "gthread":
+    default_workers = cpus + 1
+else:
+    default_workers = cpus
+
+workers = _env_int("GUNICORN_WORKERS", _env_int("WEB_CONCURRENCY", min(default_workers, max_workers)))
+threads = _env_int("GUNICORN_THREADS", 4) if worker_class == "gthread" else 1
+worker_connections = _env_int("GUNICORN_CONNECTIONS", 100)
+
+if worker_class == "gevent":
+    # патчим до импорта приложения (preload грузит его в мастере)
+    from gevent import monkey
+    monkey.patch_all()
+    try:
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+    except ImportError:
+        # без psycogreen запросы к Postgres блокируют весь воркер
+        pass
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+
+max_requests = _env_int("GUNICORN_MAX_REQUESTS", 1000)
+max_requests_jitter = _env_int("GUNICORN_MAX_REQUESTS_JITTER", 100)
+preload_app = _env_bool("GUNICORN_PRELOAD", True)
+
+timeout = _env_int("GUNICORN_TIMEOUT", 30)
+graceful_timeout = _env_int("GUNICORN_GRACEFUL_TIMEOUT", 30)
+keepalive = _env_int("GUNICORN_KEEPALIVE", 5)
+
+accesslog = os.getenv("GUNICORN_ACCESSLOG", "-")
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOGLEVEL", "info")
+access_log_format = '%(h)s "%(r)s" %(s)s %(b)s %(M)sms pid=%(p)s'
+
+slow_ms = _env_int("GUNICORN_SLOW_MS", 1000)
+
+# post_request в gthread вызывается из разных потоков воркера
+_timing_lock = threading.Lock()
+
+
+_started = time.perf_counter()
+
+
+def when_ready(server):
+    if preload_app:
+        # всё, что загружено в мастере, — в постоянное поколение: сборщик мусора
+        # воркеров не трогает эти объекты, и страницы остаются общими (copy-on-write)
+        gc.freeze()
+    server.log.info(
+        "gunicorn ready in %.0f ms: %s x%d (threads=%d, connections=%d, cpus=%d, preload=%s)",
+        (time.perf_counter() - _started) * 1000,
+        worker_class, workers, threads, worker_connections, cpus, preload_app,
+    )
+
+
+def pre_fork(server, worker):
+    worker.forked_at = time.perf_counter()
+
+
+def post_worker_init(worker):
+    forked_at = getattr(worker, "forked_at", None)
+    if forked_at is not None:
+        worker.log.info("worker pid=%s booted in %.0f ms", worker.pid, (time.perf_counter() - forked_at) * 1000)
+
+
+def post_fork(server, worker):
+    # соединения с БД, открытые в мастере при preload, не должны достаться детям
+    if not preload_app:
+        return
+    try:
+        app = server.app.wsgi()
+        db = app.extensions["sqlalchemy"]
+        with app.app_context():
+            db.engine.dispose(close=False)
+    except Exception:
+        server.log.exception("post_fork: failed to reset DB pool")
+
+
+def pre_request(worker, req):
+    req._started = time.perf_counter()
+
+
+def post_request(worker, req, environ, resp):
+    started = getattr(req, "_started", None)
+    if started is None:
+        return
+    elapsed = (time.perf_counter() - started) * 1000
+    with _timing_lock:
+        worker.nr_ms = getattr(worker, "nr_ms", 0.0) + elapsed
+    if elapsed >= slow_ms:
+        worker.log.warning(
+            "slow request pid=%s %s %s -> %s in %.1f ms",
+            worker.pid, req.method, req.path, resp.status_code, elapsed,
+        )
+
+
+def worker_exit(server, worker):
+    served = getattr(worker, "nr", 0)
+    busy = getattr(worker, "nr_ms", 0.0)
+    server.log.info(
+        "worker pid=%s exiting: %d requests, %.1f ms total, %.1f ms avg",
+        worker.pid, served, busy, busy / served if served else 0.0,
+    )
@@ -14,6 +14,9 @@ class CourseModule(db.Model):
     description = db.Column(db.Text, nullable=True)
     order = db.Column(db.Integer, nullable=False, default=1)
 
+    __table_args__ = (
+        db.Index("ix_course_module_course_order", "course_id", "order"),
+    )
 
     lessons = db.relationship(
         "CourseLesson",
@@ -46,10 +49,14 @@ class CourseLesson(db.Model):
             "lesson_type IN ('lecture','test','lab')",
             name="ck_course_lesson_type",
         ),
+        db.Index("ix_course_lesson_module_order", "module_id", "order"),
     )
 
     # Поля для лекции
     html_content = db.Column(db.Text, nullable=True)     
+    # html_content после services/lesson_html.render(); его и выводит lesson_detail
+    rendered_html = db.Column(db.Text, nullable=True)
+    render_version = db.Column(db.Integer, nullable=True)
     video_url    = db.Column(db.String(500), nullable=True)
 
     # Поля для лабы
@@ -119,6 +126,10 @@ class TestAttempt(db.Model):
     score = db.Column(db.Integer, nullable=False, default=0)  # верных
     total = db.Column(db.Integer, nullable=False, default=0)  # всего
 
+    __table_args__ = (
+        db.Index("ix_test_attempt_student_lesson", "student_id", "lesson_id"),
+    )
+
 class LabAttempt(db.Model):
     __tablename__ = "lab_attempt"
 
@@ -132,6 +143,10 @@ class LabAttempt(db.Model):
 
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
 
+    __table_args__ = (
+        db.Index("ix_lab_attempt_student_lesson_correct", "student_id", "lesson_id", "is_correct"),
+    )
+
 
 class StudentProgress(db.Model):
     __tablename__ = "student_progress"
@@ -154,6 +169,11 @@ class StudentProgress(db.Model):
 
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # уникальный индекс, а не constraint: его можно построить CONCURRENTLY
+        db.Index("uq_student_progress_student_course_lesson", "student_id", "course_id", "lesson_id", unique=True),
+    )
+
     def __repr__(self):
         return f"<StudentProgress student={self.student_id} lesson={self.lesson_id} score={self.score}>"
 
@@ -166,5 +186,121 @@ class LabDefinition(db.Model):
 
     correct_flag = db.Column(db.String(255), nullable=False)
 
+    # каталог sandbox-manager: пропавшие из него лабы не удаляются, а скрываются;
+    # synced_at пустой у записей, заведённых вручную
+    available = db.Column(db.Boolean, default=True, nullable=False)
+    synced_at = db.Column(db.DateTime, nullable=True)
+
     def __repr__(self):
         return f"<LabDefinition {self.slug}>"
+
+
+class LessonResult(db.Model):
+    """Сводный результат студента по уроку, обновляется при каждой попытке."""
+    __tablename__ = "lesson_result"
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    student_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    course_id = db.Column(db.Integer, db.ForeignKey("post.id"), nullable=False)
+    lesson_id = db.Column(db.Integer, db.ForeignKey("course_lesson.id"), nullable=False)
+
+    # Лекция
+    completed = db.Column(db.Boolean, default=False, nullable=False)
+
+    # Тест: лучший score/total среди попыток
+    best_ratio = db.Column(db.Float, nullable=True)
+
+    # Тест/лаба: число попыток; лаба: решена ли
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    solved = db.Column(db.Boolean, default=False, nullable=False)
+    # лаба: неверные флаги — показываем студенту без COUNT(*) по lab_attempt
+    wrong_attempts = db.Column(db.Integer, default=0, nullable=False)
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint("student_id", "lesson_id", name="uq_lesson_result_student_lesson"),
+        db.Index("ix_lesson_result_student_course", "student_id", "course_id"),
+    )
+
+
+class CourseProgress(db.Model):
+    """Итоги студента по курсу — то, что показывает ведомость преподавателя."""
+    __tablename__ = "course_progress"
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    student_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    course_id = db.Column(db.Integer, db.ForeignKey("post.id"), nullable=False)
+
+    lectures_done = db.Column(db.Integer, default=0, nullable=False)
+    lectures_total = db.Column(db.Integer, default=0, nullable=False)
+    tests_total = db.Column(db.Integer, default=0, nullable=False)
+    tests_ratio = db.Column(db.Float, default=1.0, nullable=False)
+    labs_total = db.Column(db.Integer, default=0, nullable=False)
+    labs_solved = db.Column(db.Integer, default=0, nullable=False)
+    lab_attempts_total = db.Column(db.Integer, default=0, nullable=False)
+    final_score = db.Column(db.Float, default=0.0, nullable=False)
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint("student_id", "course_id", name="uq_course_progress_student_course"),
+        db.Index("ix_course_progress_course", "course_id"),
+    )
+
+    STAT_FIELDS = (
+        "lectures_done", "lectures_total", "tests_total", "tests_ratio",
+        "labs_total", "labs_solved", "lab_attempts_total", "final_score",
+    )
+
+    def as_stats(self) -> dict:
+        return {field: getattr(self, field) for field in self.STAT_FIELDS}
+
+    def __repr__(self):
+        return f"<CourseProgress student={self.student_id} course={self.course_id} score={self.final_score}>"
+
+
+class LabLaunch(db.Model):
+    """Запуск песочницы: создаётся сразу, client_url заполняет фоновый поток."""
+    __tablename__ = "lab_launch"
+
+    STARTING = "starting"
+    READY = "ready"
+    FAILED = "failed"
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=True)
+    course_id = db.Column(db.Integer, db.ForeignKey("post.id"), nullable=False)
+    lesson_id = db.Column(db.Integer, db.ForeignKey("course_lesson.id"), nullable=False)
+    lab_slug = db.Column(db.String(150), nullable=False)
+
+    status = db.Column(db.String(12), nullable=False, default=STARTING)
+    client_url = db.Column(db.String(500), nullable=True)
+    error = db.Column(db.String(500), nullable=True)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<LabLaunch {self.id} {self.lab_slug} {self.status}>"
+
+
+class WarmSandbox(db.Model):
+    """Заранее поднятая сессия песочницы, ждёт, пока её заберёт run_lab."""
+    __tablename__ = "warm_sandbox"
+
+    id = db.Column(db.Integer, primary_key=True)
+    lab_slug = db.Column(db.String(150), nullable=False)
+    client_url = db.Column(db.String(500), nullable=False)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.Index("ix_warm_sandbox_slug_created", "lab_slug", "created_at"),
+    )
+
+    def __repr__(self):
+        return f"<WarmSandbox {self.lab_slug} {self.id}>"
@@ -0,0 +1,65 @@
+from datetime import datetime
+
+from ..extensions import db
+
+
+class UploadedImage(db.Model):
+    """Загруженная картинка и её уменьшенные копии (см. services/images.py).
+
+    Новые файлы лежат по хешу содержимого: uploads/ab/cd/<sha256>.<ext>, один
+    файл на любое число ссылок (UploadRef). У старых, загруженных до этого
+    файлов sha256 пуст.
+    """
+    __tablename__ = "uploaded_image"
+
+    PENDING = "pending"
+    READY = "ready"
+    FAILED = "failed"
+
+    id = db.Column(db.Integer, primary_key=True)
+    # путь относительно static, как в Post.photo / Teacher.photo
+    path = db.Column(db.String(300), nullable=False, unique=True)
+    sha256 = db.Column(db.String(64), nullable=True, unique=True)
+    format = db.Column(db.String(10), nullable=False)
+    width = db.Column(db.Integer, nullable=False)
+    height = db.Column(db.Integer, nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+
+    status = db.Column(db.String(12), nullable=False, default=PENDING)
+    # [{"path": ..., "width": ..., "type": "image/webp"}, ...]
+    variants = db.Column(db.JSON, nullable=False, default=list)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    refs = db.relationship("UploadRef", backref="image", cascade="all, delete-orphan", lazy="dynamic")
+
+    def __repr__(self):
+        return f"<UploadedImage {self.path} {self.status}>"
+
+
+class UploadRef(db.Model):
+    """Кто использует картинку: фото курса/преподавателя или вставка в редакторе урока.
+
+    Картинки без ссылок удаляет flask images gc.
+    """
+    __tablename__ = "upload_ref"
+
+    COURSE = "course"
+    TEACHER = "teacher"
+    # owner_id — id загрузившего пользователя: из HTML урока ссылку не отследить
+    EDITOR = "editor"
+
+    id = db.Column(db.Integer, primary_key=True)
+    image_id = db.Column(db.Integer, db.ForeignKey("uploaded_image.id"), nullable=False)
+    kind = db.Column(db.String(20), nullable=False)
+    owner_id = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint("image_id", "kind", "owner_id", name="uq_upload_ref_image_kind_owner"),
+        db.Index("ix_upload_ref_kind_owner", "kind", "owner_id"),
+    )
+
+    def __repr__(self):
+        return f"<UploadRef {self.kind}:{self.owner_id} -> {self.image_id}>"
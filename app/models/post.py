@@ -7,6 +7,8 @@ user_course = db.Table('user_course',
     db.Column('enrolled_at', db.DateTime, default=datetime.utcnow),
     db.Column('has_free_lesson', db.Boolean, default=False)
 )
+# PK (user_id, course_id) не помогает выборкам «все студенты курса»
+db.Index('ix_user_course_course_id', user_course.c.course_id)
 
 teacher_course = db.Table('teacher_course',
     db.Column('teacher_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
@@ -24,12 +26,26 @@ class Post(db.Model):
     tag = db.Column(db.String(50))                    
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # Растёт при любом изменении структуры/уроков курса — ключ для кешей
+    content_version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    content_updated_at = db.Column(db.DateTime, default=datetime.utcnow, server_default=db.func.now())
+
     students = db.relationship('User', secondary=user_course, backref=db.backref('courses', lazy='dynamic'))
 
     teachers = db.relationship('User', secondary=teacher_course, backref=db.backref('teaching_courses', lazy='dynamic'))
 
     modules = db.relationship('CourseModule', backref='course', lazy=True, order_by='CourseModule.order')
+
+    # keyset-пагинация каталога: новые сверху
+    __table_args__ = (
+        db.Index('ix_post_created_id', 'created_at', 'id'),
+    )
     
+    def bump_version(self):
+        # выражение, а не +1 в Python: инкремент атомарен при параллельных правках
+        self.content_version = Post.content_version + 1
+        self.content_updated_at = datetime.utcnow()
+
     def __repr__(self):
         return f'<Course {self.name}>'
 
@@ -1,10 +1,11 @@
-from ..extensions import db, login_manager, bcrypt
+from ..extensions import db, login_manager
 from flask_login import UserMixin
 from ..models.post import user_course, teacher_course
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    from ..services.identity import load_identity
+    return load_identity(int(user_id))
 
 class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
@@ -14,12 +15,23 @@ class User(db.Model, UserMixin):
     login = db.Column(db.String(50), unique=True, index=True)
     password = db.Column(db.String(500))  
 
+    # списки пользователей по роли листаются keyset-страницами по id
+    __table_args__ = (
+        db.Index('ix_user_status_id', 'status', 'id'),
+    )
+
 
     def set_password(self, raw_password: str) -> None:
-        self.password = bcrypt.generate_password_hash(raw_password).decode('utf-8')
+        from ..services.passwords import hash_password
+        self.password = hash_password(raw_password)
 
     def check_password(self, raw_password: str) -> bool:
-        return bcrypt.check_password_hash(self.password, raw_password)
+        from ..services.passwords import verify_password
+        return verify_password(self.password, raw_password)
+
+    def password_needs_rehash(self) -> bool:
+        from ..services.passwords import needs_rehash
+        return needs_rehash(self.password)
 
 
     def enroll_in_course(self, course):
@@ -51,6 +63,8 @@ class User(db.Model, UserMixin):
     def assign_to_course(self, course):
         if course not in self.teaching_courses:
             self.teaching_courses.append(course)
+            # преподаватели выводятся на странице курса — новые ETag и фрагменты
+            course.bump_version()
             db.session.commit()
             return True
         return False
@@ -58,6 +72,7 @@ class User(db.Model, UserMixin):
     def remove_from_course(self, course):
         if course in self.teaching_courses:
             self.teaching_courses.remove(course)
+            course.bump_version()
             db.session.commit()
             return True
         return False
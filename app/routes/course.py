@@ -1,10 +1,9 @@
-import os
 from typing import List
 from datetime import datetime
 
 from flask import (
     Blueprint, render_template, request, redirect, url_for,
-    flash, jsonify
+    flash, jsonify, abort
 )
 from flask_login import login_required, current_user
 
@@ -13,21 +12,36 @@ from ..models.post import Post, user_course
 from ..models.course import (
     CourseModule, CourseLesson, LessonType,
     CourseTest, TestQuestion, TestOption, TestAttempt,
-    StudentProgress, LabAttempt, LabDefinition
+    StudentProgress, LabAttempt, LessonResult, CourseProgress
 )
 from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import defer, joinedload
 from ..models.user import User
+from ..models.image import UploadRef
+from ..services.gradebook import compute_course_gradebook
+from ..services.progress import (
+    record_lecture_completed, record_test_attempt, record_lab_attempt,
+    refresh_course_progress, forget_lessons, course_progress_stats,
+)
+from ..services.outline import get_outline, invalidate_outline
+from ..services.course_tests import get_test_snapshot, get_answer_key
+from ..services.lab_flags import check_flag
+from ..services.lab_catalog import lab_catalog, validate_slug
+from ..services.pagination import paginate, per_page_arg, sort_arg
+from ..services.conditional import conditional_page, page_etag, latest
+from ..services import images
+from ..services.lesson_html import set_lesson_html
+from .post import course_page, COURSE_SORT_LABELS
 
 course_bp = Blueprint("course", __name__)
 
-
-SANDBOX_BASE_URL = os.getenv("SANDBOX_BASE_URL", "http://127.0.0.1:8000")
-SANDBOX_API_KEY  = os.getenv("SANDBOX_API_KEY", "dev-secret-change-me")
-
-
-
-UPLOAD_DIR = os.path.join("app", "static", "uploads", "courses")
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+# ведомость: по имени или сначала недавно зарегистрированные
+ROSTER_SORTS = {
+    "name": (lambda: [(func.coalesce(User.name, ""), False), (User.id, False)],
+             lambda u: [u.name or "", u.id]),
+    "date": (lambda: [(User.id, True)], None),
+}
 
 
 
@@ -68,85 +82,41 @@ def is_student_enrolled(course: Post) -> bool:
     ).first()
     return q is not None
 
-def compute_course_stats_for_student(course: Post, student: User):
-    # все уроки курса
-    lessons_q = CourseLesson.query.join(CourseModule).filter(
-        CourseModule.course_id == course.id
-    )
-
-    lecture_ids = [l.id for l in lessons_q.filter(CourseLesson.lesson_type == LessonType.lecture).all()]
-    test_ids    = [l.id for l in lessons_q.filter(CourseLesson.lesson_type == LessonType.test).all()]
-    lab_ids     = [l.id for l in lessons_q.filter(CourseLesson.lesson_type == LessonType.lab).all()]
-
-
-    from ..models.course import StudentProgress 
-
-    lectures_total = len(lecture_ids)
-    lectures_done = 0
-    if lecture_ids:
-        lectures_done = StudentProgress.query.filter(
-            StudentProgress.student_id == student.id,
-            StudentProgress.course_id == course.id,
-            StudentProgress.completed.is_(True),
-            StudentProgress.lesson_id.in_(lecture_ids)
-        ).count()
-
-
-    tests_total = len(test_ids)
-    tests_with_attempts = 0
-    test_quality_ratio = 1.0  
-
-    if tests_total > 0:
-        best_ratios = []
-        for lid in test_ids:
-            attempts = TestAttempt.query.filter_by(
-                student_id=student.id,
-                lesson_id=lid
-            ).all()
-            if not attempts:
-                best_ratios.append(0.0)
-                continue
-            best = max(a.score / a.total if a.total else 0.0 for a in attempts)
-            if best > 0:
-                tests_with_attempts += 1
-            best_ratios.append(best)
-        test_quality_ratio = sum(best_ratios) / len(best_ratios) if best_ratios else 0.0
-
+def course_content_changed(course: Post) -> None:
+    """Структура или уроки курса изменились: новая версия курса и сброс кеша оглавления."""
+    course.bump_version()
+    invalidate_outline(course.id)
 
-    labs_total = len(lab_ids)
-    labs_solved = 0
-    lab_attempts_total = 0
 
-    if lab_ids:
-
-        for lid in lab_ids:
-            attempts_q = LabAttempt.query.filter_by(
-                student_id=student.id,
-                lesson_id=lid
-            )
-            lab_attempts_total += attempts_q.count()
-            solved = attempts_q.filter_by(is_correct=True).first() is not None
-            if solved:
-                labs_solved += 1
+def render_course_detail(course: Post):
+    # только оглавление: модалки редактирования уроков грузятся из lesson_edit_modal
+    modules = get_outline(course)
+    # преподаватель не этого курса видит страницу как гость: без форм правки
+    staff = is_teacher_or_admin(course)
+    labs = lab_catalog() if staff else ()
 
+    progress_percentage = 0
+    completed_lessons = []
+    total_lectures = 0
+    total_tests = 0
 
-    lectures_ratio = lectures_done / lectures_total if lectures_total else 1.0
-    tests_ratio    = test_quality_ratio
-    labs_ratio     = labs_solved / labs_total if labs_total else 1.0
 
+    return render_template(
+        "course/course_detail.html",
+        course=course,
+        modules=modules,
+        staff=staff,
+        lab_catalog=labs,
+        user=current_user,
+        progress_percentage=progress_percentage,
+        completed_lessons=completed_lessons,
+        total_lectures=total_lectures,
+        total_tests=total_tests,
+    )
 
-    final_score = round((lectures_ratio + tests_ratio + labs_ratio) / 3 * 10, 1)
 
-    return {
-        "lectures_done": lectures_done,
-        "lectures_total": lectures_total,
-        "tests_total": tests_total,
-        "tests_ratio": tests_ratio,
-        "labs_total": labs_total,
-        "labs_solved": labs_solved,
-        "lab_attempts_total": lab_attempts_total,
-        "final_score": final_score,
-    }
+def compute_course_stats_for_student(course: Post, student: User):
+    return compute_course_gradebook(course.id, [student.id])[student.id]
 
 
 
@@ -194,10 +164,10 @@ def start_lab(course_id: int, lesson_id: int):
 @login_required
 def course_list():
     if current_user.status in ("teacher", "admin"):
-        courses = Post.query.order_by(Post.created_at.desc()).all()
+        courses = course_page(Post.query)
     else:
-        courses = current_user.courses.order_by(Post.created_at.desc()).all()
-    return render_template("course/course_list.html", courses=courses)
+        courses = course_page(current_user.courses)
+    return render_template("course/course_list.html", courses=courses, course_sorts=COURSE_SORT_LABELS)
 
 
 @course_bp.route("/course/<int:course_id>")
@@ -209,23 +179,22 @@ def course_detail(course_id: int):
         flash("У вас нет доступа к этому курсу", "error")
         return redirect(url_for("user.account"))
 
-    modules = course.modules
-
-    progress_percentage = 0
-    completed_lessons = []
-    total_lectures = 0
-    total_tests = 0
-
-
-    return render_template(
-        "course/course_detail.html",
-        course=course,
-        modules=modules,
-        user=current_user,
-        progress_percentage=progress_percentage,
-        completed_lessons=completed_lessons,
-        total_lectures=total_lectures,
-        total_tests=total_tests,
+    staff = is_teacher_or_admin(course)
+    parts = [course.id, course.content_version, current_user.id, current_user.status, staff]
+    progress_at = None
+    if staff:
+        # форма добавления урока содержит список лаб из каталога
+        parts.append(tuple(lab.slug for lab in lab_catalog()))
+    elif current_user.status == "student":
+        progress_at = db.session.query(CourseProgress.updated_at).filter_by(
+            student_id=current_user.id, course_id=course.id
+        ).scalar()
+        parts.append(progress_at)
+
+    return conditional_page(
+        page_etag("course", *parts),
+        latest(course.content_updated_at, progress_at),
+        lambda: render_course_detail(course),
     )
 
 @course_bp.route("/lesson/<int:lesson_id>/progress", methods=["POST"])
@@ -238,10 +207,11 @@ def mark_lesson_completed(lesson_id):
     if current_user.status != "student" or course not in current_user.courses:
         return jsonify({"error": "Нет доступа"}), 403
 
-    progress = StudentProgress.query.filter_by(
+    query = StudentProgress.query.filter_by(
         student_id=current_user.id,
         lesson_id=lesson_id
-    ).first()
+    )
+    progress = query.first()
 
     if not progress:
         progress = StudentProgress(
@@ -251,11 +221,17 @@ def mark_lesson_completed(lesson_id):
             completed=True,
             completed_at=datetime.utcnow(),
         )
-        db.session.add(progress)
-    else:
-        progress.completed = True
-        progress.completed_at = datetime.utcnow()
+        # двойной клик: второй запрос упрётся в уникальный индекс — берём строку первого
+        try:
+            with db.session.begin_nested():
+                db.session.add(progress)
+        except IntegrityError:
+            progress = query.one()
+
+    progress.completed = True
+    progress.completed_at = datetime.utcnow()
 
+    record_lecture_completed(current_user.id, course.id, lesson_id)
     db.session.commit()
 
     return jsonify({"success": True, "message": "Лекция отмечена как просмотренная"})
@@ -265,7 +241,10 @@ def mark_lesson_completed(lesson_id):
 @login_required
 def lesson_detail(course_id: int, lesson_id: int):
     course = Post.query.get_or_404(course_id)
-    lesson = CourseLesson.query.get_or_404(lesson_id)
+    # HTML урока бывает огромным — читаем его, только если страницу придётся рендерить
+    lesson = CourseLesson.query.options(
+        defer(CourseLesson.html_content), defer(CourseLesson.rendered_html),
+    ).get_or_404(lesson_id)
 
     if current_user.status == "student":
         if not is_student_enrolled(course):
@@ -275,19 +254,42 @@ def lesson_detail(course_id: int, lesson_id: int):
         flash("Вы не ведете этот курс", "error")
         return redirect(url_for("user.account"))
 
-    attempts = None
-    if current_user.status == "student" and lesson.lesson_type == LessonType.test:
-        attempts = TestAttempt.query.filter_by(
-            student_id=current_user.id,
-            lesson_id=lesson.id
-        ).order_by(TestAttempt.created_at.desc()).all()
+    # урок меняется только через edit_lesson/course_admin — они поднимают версию курса
+    parts = [course.id, course.content_version, lesson.id, current_user.id, current_user.status]
+    progress_at = None
+    if current_user.status == "student":
+        result = db.session.query(
+            LessonResult.completed, LessonResult.attempts, LessonResult.solved,
+            LessonResult.best_ratio, LessonResult.updated_at,
+        ).filter_by(student_id=current_user.id, lesson_id=lesson.id).first()
+        if result is not None:
+            parts.append(tuple(result))
+            progress_at = result.updated_at
+
+    def render():
+        attempts = None
+        test = None
+        if lesson.lesson_type == LessonType.test:
+            test = get_test_snapshot(course, lesson.id)
+            if current_user.status == "student":
+                attempts = TestAttempt.query.filter_by(
+                    student_id=current_user.id,
+                    lesson_id=lesson.id
+                ).order_by(TestAttempt.created_at.desc()).all()
+
+        return render_template(
+            "course/lesson_detail.html",
+            course=course,
+            lesson=lesson,
+            test=test,
+            attempts=attempts,
+            user=current_user,
+        )
 
-    return render_template(
-        "course/lesson_detail.html",
-        course=course,
-        lesson=lesson,
-        attempts=attempts,
-        user=current_user,
+    return conditional_page(
+        page_etag("lesson", *parts),
+        latest(course.content_updated_at, progress_at),
+        render,
     )
 
 
@@ -313,14 +315,21 @@ def edit_lesson(course_id: int, lesson_id: int):
         video_url = request.form.get("video_url") or ""
         sandbox_slug = (request.form.get("sandbox_slug") or "").strip()
 
+        # пустой slug проверяем всегда: иначе лаба без песочницы сохранится молча
+        if lesson.lesson_type == LessonType.lab and (not sandbox_slug or sandbox_slug != lesson.sandbox_slug):
+            error = validate_slug(sandbox_slug)
+            if error:
+                flash(error, "error")
+                return redirect(url_for("course.edit_lesson", course_id=course.id, lesson_id=lesson.id))
+
         lesson.title = title
 
         if lesson.lesson_type == LessonType.lecture:
-            lesson.html_content = html_content
+            set_lesson_html(lesson, html_content)
             lesson.video_url = video_url
 
         elif lesson.lesson_type == LessonType.lab:
-            lesson.html_content = html_content
+            set_lesson_html(lesson, html_content)
             lesson.sandbox_slug = sandbox_slug
 
         if lesson.lesson_type == LessonType.test and lesson.test:
@@ -331,6 +340,7 @@ def edit_lesson(course_id: int, lesson_id: int):
 
             lesson.title = test_title
 
+        course_content_changed(course)
         db.session.commit()
         flash("Урок обновлён", "success")
         return redirect(url_for("course.course_detail", course_id=course.id))
@@ -340,11 +350,34 @@ def edit_lesson(course_id: int, lesson_id: int):
         course=course,
         lesson=lesson,
         LessonType=LessonType,
+        lab_catalog=lab_catalog() if lesson.lesson_type == LessonType.lab else (),
         user=current_user,
     )
 
 
 
+@course_bp.route("/course/<int:course_id>/lesson/<int:lesson_id>/edit_modal")
+@login_required
+def lesson_edit_modal(course_id: int, lesson_id: int):
+    """HTML модалки редактирования урока для страницы курса."""
+    course = Post.query.get_or_404(course_id)
+    # запрос идёт из fetch: редирект с флешкой вставился бы в страницу вместо модалки
+    if not is_teacher_or_admin(course):
+        abort(403)
+
+    lesson = CourseLesson.query.options(joinedload(CourseLesson.test)).join(CourseModule).filter(
+        CourseLesson.id == lesson_id, CourseModule.course_id == course.id
+    ).first_or_404()
+    labs = lab_catalog() if lesson.lesson_type == LessonType.lab else ()
+
+    return conditional_page(
+        page_etag("lesson-modal", lesson.id, course.content_version, current_user.id,
+                  tuple((lab.slug, lab.title) for lab in labs)),
+        course.content_updated_at,
+        lambda: render_template("course/_lesson_modal.html", course=course, lesson=lesson, lab_catalog=labs),
+    )
+
+
 @course_bp.route("/course/<int:course_id>/admin", methods=["GET", "POST"])
 @login_required
 def course_admin(course_id: int):
@@ -365,6 +398,7 @@ def course_admin(course_id: int):
 
             m = CourseModule(course_id=course.id, title=title, description=description, order=next_order)
             db.session.add(m)
+            course_content_changed(course)
             db.session.commit()
             flash("Модуль добавлен", "success")
             return redirect(url_for("course.course_admin", course_id=course.id))
@@ -386,10 +420,12 @@ def course_admin(course_id: int):
                 title=title,
                 order=next_order,
                 lesson_type=LessonType.lecture,
-                html_content=html_content,
                 video_url=video_url,
             )
+            set_lesson_html(lesson, html_content)
             db.session.add(lesson)
+            refresh_course_progress(course.id)
+            course_content_changed(course)
             db.session.commit()
             flash("Лекция добавлена", "success")
             return redirect(url_for("course.course_admin", course_id=course.id))
@@ -413,6 +449,8 @@ def course_admin(course_id: int):
             )
             test = CourseTest(lesson=lesson, title=title, description="Тест по материалам урока")
             db.session.add_all([lesson, test])
+            refresh_course_progress(course.id)
+            course_content_changed(course)
             db.session.commit()
             flash("Тест добавлен", "success")
             return redirect(url_for("course.course_admin", course_id=course.id))
@@ -427,6 +465,10 @@ def course_admin(course_id: int):
 
             title = (request.form.get("title") or "").strip() or "Новая лабораторная"
             sandbox_slug = (request.form.get("sandbox_slug") or "").strip()
+            error = validate_slug(sandbox_slug)
+            if error:
+                flash(error, "error")
+                return redirect(url_for("course.course_admin", course_id=course.id))
             next_order = module.lessons.count() + 1
 
             lesson = CourseLesson(
@@ -437,6 +479,8 @@ def course_admin(course_id: int):
                 sandbox_slug=sandbox_slug,
             )
             db.session.add(lesson)
+            refresh_course_progress(course.id)
+            course_content_changed(course)
             db.session.commit()
             flash("Лабораторная добавлена", "success")
             return redirect(url_for("course.course_admin", course_id=course.id))
@@ -448,7 +492,10 @@ def course_admin(course_id: int):
             if module.course_id != course.id:
                 flash("Неверный модуль", "error")
                 return redirect(url_for("course.course_admin", course_id=course.id))
+            forget_lessons(l.id for l in module.lessons)
             db.session.delete(module)
+            refresh_course_progress(course.id)
+            course_content_changed(course)
             db.session.commit()
             flash("Модуль удалён", "success")
             return redirect(url_for("course.course_admin", course_id=course.id))
@@ -460,7 +507,10 @@ def course_admin(course_id: int):
             if lesson.module.course_id != course.id:
                 flash("Неверный урок", "error")
                 return redirect(url_for("course.course_admin", course_id=course.id))
+            forget_lessons([lesson.id])
             db.session.delete(lesson)
+            refresh_course_progress(course.id)
+            course_content_changed(course)
             db.session.commit()
             flash("Урок удалён", "success")
             return redirect(url_for("course.course_admin", course_id=course.id))
@@ -495,12 +545,12 @@ def course_admin(course_id: int):
                 )
                 db.session.add(o)
 
+            course_content_changed(course)
             db.session.commit()
             flash("Вопрос добавлен", "success")
             return redirect(url_for("course.course_detail", course_id=course.id))
 
-    modules = course.modules
-    return render_template("course/course_detail.html", course=course, modules=modules)
+    return render_course_detail(course)
 
 
 
@@ -536,28 +586,27 @@ def submit_test(course_id: int, lesson_id: int):
         flash("Нет доступа", "error")
         return redirect(url_for("course.lesson_detail", course_id=course.id, lesson_id=lesson.id))
 
-    test = lesson.test
-    if not test:
+    answer_key = get_answer_key(course, lesson.id)
+    if not answer_key:
         flash("Тест не настроен", "error")
         return redirect(url_for("course.lesson_detail", course_id=course.id, lesson_id=lesson.id))
 
-    correct = 0
-    total = len(test.questions)
-    for q in test.questions:
-        field = f"q_{q.id}"
-        opt_id = request.form.get(field)
-        if not opt_id:
-            continue
-        try:
-            opt_id = int(opt_id)
-        except ValueError:
-            continue
-        opt = TestOption.query.get(opt_id)
-        if opt and opt.question_id == q.id and opt.is_correct:
-            correct += 1
+    answers = {}
+    for q_id in answer_key.correct:
+        selected = []
+        for opt_id in request.form.getlist(f"q_{q_id}"):
+            try:
+                selected.append(int(opt_id))
+            except ValueError:
+                continue
+        answers[q_id] = selected
+
+    # проверка целиком в памяти, без запроса на каждый вариант
+    correct, total = answer_key.grade(answers)
 
     attempt = TestAttempt(student_id=current_user.id, lesson_id=lesson.id, score=correct, total=total)
     db.session.add(attempt)
+    record_test_attempt(current_user.id, course.id, lesson.id, correct, total)
     db.session.commit()
 
     flash(f"Тест отправлен. Результат: {correct}/{total}", "success")
@@ -572,6 +621,9 @@ def submit_flag(course_id: int, lesson_id: int):
     course = Post.query.get_or_404(course_id)
     lesson = CourseLesson.query.get_or_404(lesson_id)
 
+    # course_id из URL идёт в LessonResult: урок чужого курса записался бы не туда
+    if lesson.module.course_id != course.id:
+        abort(404)
     if lesson.lesson_type != LessonType.lab:
         abort(400)
 
@@ -583,18 +635,12 @@ def submit_flag(course_id: int, lesson_id: int):
         return redirect(url_for("course.lesson_detail", course_id=course.id, lesson_id=lesson.id))
 
 
-    lab_def = None
-    if lesson.sandbox_slug:
-        lab_def = LabDefinition.query.filter_by(slug=lesson.sandbox_slug).first()
+    is_correct = check_flag(lesson.sandbox_slug, submitted_flag) if lesson.sandbox_slug else None
 
-    if not lab_def:
+    if is_correct is None:
         flash("Для этой лабораторной не задан правильный флаг (обратитесь к преподавателю).", "error")
         return redirect(url_for("course.lesson_detail", course_id=course.id, lesson_id=lesson.id))
 
-    expected_flag = (lab_def.correct_flag or "").strip()
-
-    is_correct = submitted_flag == expected_flag
-
     attempt = LabAttempt(
         student_id=current_user.id,
         lesson_id=lesson.id,
@@ -603,14 +649,15 @@ def submit_flag(course_id: int, lesson_id: int):
         created_at=datetime.utcnow()
     )
     db.session.add(attempt)
+    result = record_lab_attempt(current_user.id, course.id, lesson.id, is_correct)
 
     if is_correct:
-  
-        progress = StudentProgress.query.filter_by(
+        query = StudentProgress.query.filter_by(
             student_id=current_user.id,
             course_id=course.id,
             lesson_id=lesson.id
-        ).first()
+        )
+        progress = query.first()
 
         if not progress:
             progress = StudentProgress(
@@ -618,7 +665,12 @@ def submit_flag(course_id: int, lesson_id: int):
                 course_id=course.id,
                 lesson_id=lesson.id,
             )
-            db.session.add(progress)
+            # параллельная отправка того же флага упрётся в уникальный индекс
+            try:
+                with db.session.begin_nested():
+                    db.session.add(progress)
+            except IntegrityError:
+                progress = query.one()
 
         progress.completed = True
         progress.completed_at = datetime.utcnow()
@@ -628,12 +680,8 @@ def submit_flag(course_id: int, lesson_id: int):
         flash("Флаг принят, лабораторная засчитана ✅", "success")
 
     else:
+        wrong_attempts = result.wrong_attempts
         db.session.commit()
-        wrong_attempts = LabAttempt.query.filter_by(
-            student_id=current_user.id,
-            lesson_id=lesson.id,
-            is_correct=False
-        ).count()
         flash(f"Флаг неверный. Неверных попыток: {wrong_attempts}", "error")
 
     return redirect(url_for("course.lesson_detail", course_id=course.id, lesson_id=lesson.id))
@@ -650,18 +698,14 @@ def upload_image():
     if not f or not f.filename:
         return jsonify({"error": "Файл не получен"}), 400
 
-    filename = f.filename.strip().replace(" ", "_")
-    save_path = os.path.join(UPLOAD_DIR, filename)
-    base, ext = os.path.splitext(filename)
-    i = 1
-    while os.path.exists(save_path):
-        filename = f"{base}_{i}{ext}"
-        save_path = os.path.join(UPLOAD_DIR, filename)
-        i += 1
-    f.save(save_path)
+    try:
+        image = images.save_upload(f)
+    except images.ImageRejected as e:
+        return jsonify({"error": str(e)}), 400
+    images.attach(image, UploadRef.EDITOR, current_user.id)
+    db.session.commit()
 
-    rel_url = url_for("static", filename=f"uploads/courses/{filename}")
-    return jsonify({"url": rel_url})
+    return jsonify({"url": url_for("static", filename=image.path)})
 
 
 @course_bp.route("/course/<int:course_id>/students")
@@ -673,20 +717,29 @@ def course_students(course_id: int):
         flash("Доступ запрещён", "error")
         return redirect(url_for("user.account"))
 
-  
-    students = course.students  
+
+    sort = sort_arg(list(ROSTER_SORTS))
+    order, key = ROSTER_SORTS[sort]
+    roster = User.query.join(user_course, user_course.c.user_id == User.id).filter(
+        user_course.c.course_id == course.id
+    )
+    students = paginate(roster, order(), key=key, sort=sort,
+                        cursor=request.args.get("after"), per_page=per_page_arg())
+
+    # ведомость читается из course_progress, без пересчёта сырых попыток
+    gradebook = course_progress_stats(course.id, [s.id for s in students])
 
     stats_rows = []
     for s in students:
-        stats = compute_course_stats_for_student(course, s)
         stats_rows.append({
             "student": s,
-            **stats
+            **gradebook[s.id]
         })
 
     return render_template(
         "course/course_students.html",
         course=course,
         rows=stats_rows,
+        students=students,
     )
 
@@ -1,14 +1,29 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
-from werkzeug.utils import secure_filename
 from ..models.post import Post
 from ..models.user import User
+from ..models.image import UploadRef
 from ..extensions import db
+from ..services.pagination import paginate, per_page_arg, sort_arg
+from ..services import images
 import os
 from flask_login import login_required, current_user
 
 post = Blueprint('post', __name__)
 
-UPLOAD_FOLDER = 'app/static/uploads/courses'
+# сортировка каталога: новые сверху или по названию
+COURSE_SORTS = {
+    'date': lambda: [(Post.created_at, True), (Post.id, True)],
+    'name': lambda: [(Post.name, False), (Post.id, False)],
+}
+COURSE_SORT_LABELS = [('date', 'новые'), ('name', 'по названию')]
+
+
+def course_page(query):
+    """Страница курсов из query по ?sort=, ?after=, ?per_page=."""
+    sort = sort_arg(list(COURSE_SORTS))
+    return paginate(query, COURSE_SORTS[sort](), sort=sort,
+                    cursor=request.args.get('after'), per_page=per_page_arg(24))
+
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 
 def allowed_file(filename):
@@ -26,37 +41,38 @@ def create():
             tag = request.form.get('tag')
             
             photo = request.files['photo']
-            filename = None
+            image = None
             
             if photo and allowed_file(photo.filename):
-                os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-                
-                filename = secure_filename(f"course_{name}_{photo.filename}")
-                photo_path = os.path.join(UPLOAD_FOLDER, filename)
-                photo.save(photo_path)
-                filename = f"uploads/courses/{filename}"
+                image = images.save_upload(photo)
             
             new_course = Post(
                 name=name,
                 bio=bio,
                 exp=exp,
                 level=level,
-                photo=filename,
+                photo=image.path if image else None,
                 tag=tag
             )
             
             db.session.add(new_course)
+            if image:
+                db.session.flush()
+                images.attach(image, UploadRef.COURSE, new_course.id)
             db.session.commit()
             
             flash('Курс успешно добавлен!', 'success')
             return redirect(url_for('post.create'))
             
+        except images.ImageRejected as e:
+            flash(f'Изображение не принято: {e}', 'error')
         except Exception as e:
             db.session.rollback()
             flash(f'Ошибка при добавлении курса: {str(e)}', 'error')
     
-    courses = Post.query.order_by(Post.created_at.desc()).all()
-    return render_template('main/courses.html', courses = courses)
+    courses = course_page(Post.query)
+    images.prefetch(course.photo for course in courses)
+    return render_template('main/courses.html', courses = courses, course_sorts = COURSE_SORT_LABELS)
 
 
 @post.route('/courses/<int:id>/edit', methods=['GET', 'POST'])
@@ -75,6 +91,8 @@ def edit(id):
         course.exp = request.form.get('exp')
         course.level = request.form.get('level')
         course.tag = request.form.get('tag')
+        # карточка курса есть на страницах курса и уроков: без новой версии браузеры получат 304
+        course.bump_version()
         
         try:
             db.session.commit()
@@ -95,6 +113,7 @@ def delete(id):
     course = Post.query.get(id)
     
     try:        
+        images.detach(UploadRef.COURSE, course.id)
         db.session.delete(course)
         db.session.commit()
         flash('Курс успешно удален!', 'success')
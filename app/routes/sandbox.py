@@ -1,11 +1,15 @@
-from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash, jsonify, abort, make_response, session
 from flask_login import current_user
-import requests
 from ..models.post import Post  
 from ..extensions import db
+from ..services import sandbox_client
+from ..services.lab_provisioning import start_launch, expire_if_stuck
 
 sandbox_bp = Blueprint("sandbox", __name__, url_prefix="/sandbox")
 
+# сколько последних анонимных запусков помнить в сессии
+ANON_LAUNCHES = 5
+
 # Старт лабы для конкретного урока
 @sandbox_bp.route("/run/<int:course_id>/<int:lesson_id>", methods=["GET"])
 def run_lab(course_id, lesson_id):
@@ -16,67 +20,150 @@ def run_lab(course_id, lesson_id):
         flash("Этот урок не является лабораторной", "warning")
         return redirect(url_for("course.course_detail", course_id=course_id))
 
-    lab_slug = lesson.sandbox_slug or "fakebank"
+    lab_slug = lesson.sandbox_slug
+    if not lab_slug:
+        flash("Для этой лабораторной не выбрана песочница (обратитесь к преподавателю)", "error")
+        return redirect(url_for("course.course_detail", course_id=course_id))
 
-    base = current_app.config["SANDBOX_BASE"]
-    api_key = current_app.config["SANDBOX_API_KEY"]
+    # менеджер лежит — отвечаем сразу, не создавая заведомо неудачный запуск
+    if sandbox_client.breaker.is_open():
+        return _labs_unavailable(course_id, lesson)
 
-    try:
-        r = requests.post(
-            f"{base}/api/v1/sessions",
-            json={"lab_slug": lab_slug, "user_id": getattr(current_user, "id", None)},
-            headers={"X-Api-Key": api_key},
-            timeout=10,
-        )
-        r.raise_for_status()
-    except Exception as e:
-        current_app.logger.exception("sandbox create session failed")
-        flash(f"Не удалось запустить песочницу: {e}", "danger")
-        return redirect(url_for("course.course_detail", course_id=course_id))
+    # сам запуск идёт в фоне — воркер не ждёт sandbox-manager
+    launch = start_launch(course_id, lesson.id, lab_slug, getattr(current_user, "id", None))
+    if launch.user_id is None:
+        # у анонимного запуска нет владельца в БД — запоминаем его в сессии
+        session["lab_launches"] = (session.get("lab_launches", []) + [launch.id])[-ANON_LAUNCHES:]
+    return redirect(url_for("sandbox.launch_page", launch_id=launch.id))
 
-    data = r.json()
-    iframe_src = data["client_url"]
 
-    return render_template(
-        "course/lab_run.html",
+def _labs_unavailable(course_id, lesson):
+    retry_after = sandbox_client.breaker.retry_after()
+    resp = make_response(render_template(
+        "course/lab_unavailable.html",
         course_id=course_id,
         lesson=lesson,
-        iframe_src=iframe_src,
+        retry_after=retry_after,
+    ), 503)
+    resp.headers["Retry-After"] = str(retry_after)
+    return resp
+
+
+def _get_launch(launch_id):
+    from ..models.course import LabLaunch
+
+    launch = db.session.get(LabLaunch, launch_id)
+    if launch is None:
+        abort(404)
+    if launch.user_id is None:
+        owner = launch.id in session.get("lab_launches", [])
+    else:
+        owner = launch.user_id == getattr(current_user, "id", None)
+    if not owner:
+        abort(404)
+    expire_if_stuck(launch)
+    return launch
+
+
+# Страница запуска: пока песочница стартует — заглушка с опросом статуса
+@sandbox_bp.route("/launch/<int:launch_id>", methods=["GET"])
+def launch_page(launch_id):
+    from ..models.course import CourseLesson, LabLaunch
+
+    launch = _get_launch(launch_id)
+    lesson = CourseLesson.query.get_or_404(launch.lesson_id)
+
+    if launch.status == LabLaunch.FAILED:
+        flash(f"Не удалось запустить песочницу: {launch.error}", "danger")
+        return redirect(url_for("course.course_detail", course_id=launch.course_id))
+
+    if launch.status == LabLaunch.READY:
+        return render_template(
+            "course/lab_run.html",
+            course_id=launch.course_id,
+            lesson=lesson,
+            iframe_src=launch.client_url,
+        )
+
+    return render_template(
+        "course/lab_starting.html",
+        course_id=launch.course_id,
+        lesson=lesson,
+        launch=launch,
     )
 
 
+# Лёгкий статус для опроса со страницы запуска
+@sandbox_bp.route("/launch/<int:launch_id>/status", methods=["GET"])
+def launch_status(launch_id):
+    from datetime import datetime
+    from ..models.course import LabLaunch
+
+    launch = _get_launch(launch_id)
+    payload = {
+        "status": launch.status,
+        "elapsed": int((datetime.utcnow() - launch.created_at).total_seconds()),
+    }
+    if launch.status == LabLaunch.READY:
+        payload["url"] = url_for("sandbox.launch_page", launch_id=launch.id)
+    elif launch.status == LabLaunch.FAILED:
+        payload["error"] = launch.error
+    return jsonify(payload)
+
+
+def _back_to_lab(course_id, lesson_id):
+    """Вернуться в уже запущенную песочницу, а не поднимать новую."""
+    from ..models.course import LabLaunch
+
+    user_id = getattr(current_user, "id", None)
+    launch = None
+    if user_id is not None:
+        launch = LabLaunch.query.filter_by(
+            user_id=user_id,
+            lesson_id=lesson_id,
+            status=LabLaunch.READY,
+        ).order_by(LabLaunch.id.desc()).first()
+    if launch:
+        return redirect(url_for("sandbox.launch_page", launch_id=launch.id))
+    return redirect(url_for("sandbox.run_lab", course_id=course_id, lesson_id=lesson_id))
+
+
 # Отправка флага из курса 
 @sandbox_bp.route("/verify/<int:course_id>/<int:lesson_id>", methods=["POST"])
 def verify_flag(course_id, lesson_id):
     from ..models.course import CourseLesson
     lesson = CourseLesson.query.get_or_404(lesson_id)
-    lab_slug = lesson.sandbox_slug or "fakebank"
+    lab_slug = lesson.sandbox_slug
+    if not lab_slug:
+        flash("Для этой лабораторной не выбрана песочница (обратитесь к преподавателю)", "error")
+        return redirect(url_for("course.course_detail", course_id=course_id))
 
     flag = request.form.get("flag", "").strip()
     if not flag:
         flash("Введите флаг", "warning")
-        return redirect(url_for("sandbox.run_lab", course_id=course_id, lesson_id=lesson_id))
-
-    base = current_app.config["SANDBOX_BASE"]
-    api_key = current_app.config["SANDBOX_API_KEY"]
+        return _back_to_lab(course_id, lesson_id)
 
     try:
-        r = requests.post(
-            f"{base}/api/v1/verify",
-            json={"lab_slug": lab_slug, "flag": flag, "user_id": getattr(getattr(request, 'user', None), 'id', None)},
-            headers={"X-Api-Key": api_key},
-            timeout=10,
-        )
-        r.raise_for_status()
-        data = r.json()
-    except Exception as e:
+        data = sandbox_client.verify_flag(lab_slug, flag, getattr(getattr(request, 'user', None), 'id', None))
+    except sandbox_client.SandboxUnavailable as e:
+        flash(str(e), "danger")
+        return _back_to_lab(course_id, lesson_id)
+    except sandbox_client.SandboxError as e:
         current_app.logger.exception("sandbox verify failed")
         flash(f"Проверка не удалась: {e}", "danger")
-        return redirect(url_for("sandbox.run_lab", course_id=course_id, lesson_id=lesson_id))
+        return _back_to_lab(course_id, lesson_id)
 
     if data.get("ok"):
         flash("Флаг принят. Задание зачтено.", "success")
     else:
         flash(data.get("message", "Флаг неверный"), "danger")
 
-    return redirect(url_for("sandbox.run_lab", course_id=course_id, lesson_id=lesson_id))
+    return _back_to_lab(course_id, lesson_id)
+
+
+# Состояние предохранителя для мониторинга
+@sandbox_bp.route("/health", methods=["GET"])
+def health():
+    if getattr(current_user, "status", None) != "admin":
+        abort(404)
+    return jsonify({"breaker": sandbox_client.breaker.snapshot()})
@@ -1,8 +1,8 @@
-from flask import Blueprint, render_template, request, redirect, url_for, current_app, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash
 from ..models.teacher import Teacher
+from ..models.image import UploadRef
 from ..extensions import db
-import os
-from werkzeug.utils import secure_filename
+from ..services import images
 from flask_login import login_required, current_user
 
 teacher = Blueprint('teacher', __name__)
@@ -21,31 +21,30 @@ def create():
             bio = request.form.get('teacher-bio')
             
             photo = request.files['teacher-photo']
-            filename = None
+            image = None
             
             if photo and allowed_file(photo.filename):
-                upload_folder = os.path.join(current_app.static_folder, 'uploads', 'teachers')
-                os.makedirs(upload_folder, exist_ok=True)
-                
-                filename = secure_filename(f"teacher_{name}_{photo.filename}")
-                photo_path = os.path.join(upload_folder, filename)
-                photo.save(photo_path)
-                filename = f"uploads/teachers/{filename}"  
+                image = images.save_upload(photo)
             
             new_teacher = Teacher(
                 name=name,
                 exp=exp,
                 subject=subject,
                 bio=bio,
-                photo=filename if filename else 'img/default-teacher.jpg'
+                photo=image.path if image else 'img/default-teacher.jpg'
             )
             
             db.session.add(new_teacher)
+            if image:
+                db.session.flush()
+                images.attach(image, UploadRef.TEACHER, new_teacher.id)
             db.session.commit()
             
             flash('Преподователь успешно добавлен!', 'success')
             return redirect(url_for('teacher.create'))
             
+        except images.ImageRejected as e:
+            flash(f'Изображение не принято: {e}', 'error')
         except Exception as e:
             print(f"Ошибка: {e}")
             db.session.rollback()
@@ -53,6 +52,7 @@ def create():
             flash(f'Ошибка при добавлении преподователя: {str(e)}', 'error')
     
     teachers = Teacher.query.all()
+    images.prefetch(teacher.photo for teacher in teachers)
     return render_template('main/teachers.html', teachers=teachers)
 
 @teacher.route('/teachers/<int:id>/delete', methods=['POST'])
@@ -62,6 +62,7 @@ def delete(id):
 
     request.method == 'POST'
     try:
+        images.detach(UploadRef.TEACHER, teacher.id)
         db.session.delete(teacher)
         db.session.commit()
         return redirect(url_for('teacher.create'))
@@ -1,12 +1,23 @@
-from flask import Blueprint, render_template, request, redirect, url_for, current_app, flash
+from flask import Blueprint, render_template, request, redirect, url_for, current_app, flash, jsonify, abort
 from flask_login import login_user, logout_user, current_user, login_required
 from ..models.user import User
 from ..models.post import Post, teacher_course
 from ..extensions import db, bcrypt, login_manager
+from ..services.identity import invalidate_identity
+from ..services import passwords
+from ..services.pagination import paginate, per_page_arg, sort_arg
+from sqlalchemy import func
 import re 
 
 user = Blueprint('user' , __name__)
 
+# сортировка списков пользователей: (ORDER BY для keyset, ключ курсора строки)
+USER_SORTS = {
+    'date': (lambda: [(User.id, True)], None),
+    'name': (lambda: [(func.coalesce(User.name, ''), False), (User.id, False)],
+             lambda u: [u.name or '', u.id]),
+}
+
 def validate_email(email):
     pattern = r'^[\w\.-]+@[\w\.-]+\.\w+$'
     return re.match(pattern, email)
@@ -69,7 +80,11 @@ def register():
             status=status
         )
 
-        new_user.set_password(password)
+        try:
+            new_user.set_password(password)
+        except passwords.HashingBusy:
+            flash('Сервер перегружен, попробуйте ещё раз через минуту', 'error')
+            return redirect(url_for('user.register'))
 
         try:
             db.session.add(new_user)
@@ -95,7 +110,20 @@ def login():
             (User.email == login_credential) | (User.login == login_credential)
         ).first()
 
-        if user_obj and user_obj.check_password(raw_password):
+        try:
+            password_ok = bool(user_obj) and user_obj.check_password(raw_password)
+        except passwords.HashingBusy:
+            flash('Сервер перегружен, попробуйте войти через минуту', 'error')
+            return redirect(url_for('user.login'))
+
+        if password_ok:
+            # хеш со старой стоимостью перевыпускаем, пока пароль в руках
+            if user_obj.password_needs_rehash():
+                try:
+                    user_obj.set_password(raw_password)
+                    db.session.commit()
+                except passwords.HashingBusy:
+                    pass
             login_user(user_obj, remember=remember)
             flash('Вы успешно вошли в систему', 'success')
             return redirect(url_for('user.index'))
@@ -118,14 +146,30 @@ def admin_users():
         flash('Доступ запрещен', 'error')
         return redirect(url_for('user.account'))
     
-    students = User.query.filter_by(status='student').all()
-    teachers = User.query.filter_by(status='teacher').all()
-    all_courses = Post.query.all()
-    
+    sort = sort_arg(list(USER_SORTS))
+    per_page = per_page_arg()
+    order, key = USER_SORTS[sort]
+
+    students = paginate(User.query.filter_by(status='student'), order(), key=key,
+                        sort=sort, cursor=request.args.get('students_after'), per_page=per_page)
+    teachers = paginate(User.query.filter_by(status='teacher'), order(), key=key,
+                        sort=sort, cursor=request.args.get('teachers_after'), per_page=per_page)
+
+    # для выпадающего списка «Прикрепить к курсу» хватает id и названия
+    all_courses = db.session.query(Post.id, Post.name).order_by(Post.name, Post.id).all()
+
     return render_template('main/adminform.html', 
                          students=students, 
                          teachers=teachers,
-                         all_courses=all_courses)
+                         all_courses=all_courses,
+                         user_sorts=[('date', 'новые'), ('name', 'по имени')])
+
+@user.route('/admin/metrics')
+@login_required
+def admin_metrics():
+    if current_user.status != 'admin':
+        abort(404)
+    return jsonify({'password_hashing': passwords.stats.snapshot()})
 
 @user.route('/admin/user/<int:user_id>/delete', methods=['POST'])
 @login_required
@@ -144,8 +188,11 @@ def delete_user(user_id):
         return redirect(url_for('user.admin_users'))
     
     try:
+        for course in user_to_delete.teaching_courses:
+            course.bump_version()
         db.session.delete(user_to_delete)
         db.session.commit()
+        invalidate_identity(user_id)
         flash('Пользователь успешно удален', 'success')
     except Exception as e:
         db.session.rollback()
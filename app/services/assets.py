@@ -0,0 +1,49 @@
+"""Собранная статика (build_assets.py) для url_for('static', ...).
+
+Если в static/dist есть manifest.json, url_for('static', filename='css/style.css')
+возвращает /static/dist/css/style.<хеш>.css. Файлов, которых нет в
+манифесте (загрузки, варианты картинок), подмена не касается. Без манифеста
+(локальная разработка) всё работает как раньше; ASSETS_MANIFEST=0
+отключает подмену, даже если сборка есть.
+"""
+import json
+import os
+from typing import Dict
+
+from flask import Flask
+
+
+MANIFEST = os.path.join("dist", "manifest.json")
+
+
+def load_manifest(app: Flask) -> Dict[str, str]:
+    path = os.path.join(app.static_folder, MANIFEST)
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except ValueError:
+        app.logger.warning("assets: %s is broken, serving unbuilt static", path)
+        return {}
+
+
+def asset_path(app: Flask, filename: str) -> str:
+    """Путь собранного файла относительно static (или filename как есть)."""
+    return app.extensions.get("assets", {}).get(filename, filename)
+
+
+def init_app(app: Flask, enabled: bool = True) -> None:
+    manifest = load_manifest(app) if enabled else {}
+    app.extensions["assets"] = manifest
+    if not manifest:
+        return
+
+    @app.url_defaults
+    def _built_static(endpoint, values):
+        if endpoint == "static":
+            filename = values.get("filename")
+            if filename in manifest:
+                values["filename"] = manifest[filename]
+
+    app.logger.info("assets: %d built files from %s", len(manifest), MANIFEST)
@@ -0,0 +1,39 @@
+"""Маленький LRU-кеш процесса для данных, ключ которых включает версию курса."""
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+
+class VersionedCache:
+    """Потокобезопасный LRU. Ключ должен содержать версию данных: при её росте
+    старые записи перестают запрашиваться и со временем вытесняются."""
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_load(self, key: Hashable, loader: Callable):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                return self._data[key]
+
+        # загрузка без блокировки: два потока могут загрузить одно и то же, это не страшно
+        value = loader()
+
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return value
+
+    def discard(self, predicate: Callable[[Hashable], bool]) -> None:
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                del self._data[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
@@ -0,0 +1,90 @@
+"""Сжатие динамических ответов (HTML, JSON) в приложении.
+
+nginx перед нами проксирует ответы как есть, а страницы курса,
+админка и кабинет — десятки и сотни килобайт HTML. after_request сжимает
+ответ, если:
+
+- клиент принимает br или gzip (br — только при установленном brotli);
+- тип из COMPRESS_MIMETYPES, а тело не меньше COMPRESS_MIN_SIZE байт;
+- ответ не потоковый (stream_with_context, send_file), не сжат заранее
+  (есть Content-Encoding) и не 1xx/204/304.
+
+Vary: Accept-Encoding ставится всем подходящим по типу ответам, сильный
+ETag становится слабым: байты сжатого и несжатого ответа разные.
+Отключается COMPRESS_ENABLED=0 — например, если сжатие включено в nginx.
+"""
+import gzip
+from typing import Optional
+
+from flask import Flask, request
+
+from .settings import get_setting
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+DEFAULT_MIN_SIZE = 1024
+DEFAULT_MIMETYPES = (
+    "text/html", "text/plain", "text/css", "text/csv",
+    "application/json", "application/javascript", "image/svg+xml",
+)
+DEFAULT_GZIP_LEVEL = 6
+# 4–5 у brotli дают сжатие лучше gzip -6 при сравнимой цене; 11 — только для статики
+DEFAULT_BR_QUALITY = 4
+
+
+def _mimetypes() -> set:
+    value = get_setting("COMPRESS_MIMETYPES", DEFAULT_MIMETYPES)
+    if isinstance(value, str):
+        value = [v for v in value.replace(" ", "").split(",") if v]
+    return set(value)
+
+
+def choose_encoding() -> Optional[str]:
+    """br или gzip по Accept-Encoding запроса с учётом q; None — не сжимать."""
+    offered = ["br", "gzip"] if brotli is not None else ["gzip"]
+    return request.accept_encodings.best_match(offered)
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=int(get_setting("COMPRESS_BR_QUALITY", DEFAULT_BR_QUALITY)))
+    return gzip.compress(data, compresslevel=int(get_setting("COMPRESS_GZIP_LEVEL", DEFAULT_GZIP_LEVEL)), mtime=0)
+
+
+def compress_response(response):
+    if response.status_code < 200 or response.status_code in (204, 304):
+        return response
+    if response.mimetype not in _mimetypes():
+        return response
+    response.vary.add("Accept-Encoding")
+
+    if response.is_streamed or response.direct_passthrough or "Content-Encoding" in response.headers:
+        return response
+
+    encoding = choose_encoding()
+    if encoding is None:
+        return response
+
+    data = response.get_data()
+    if len(data) < int(get_setting("COMPRESS_MIN_SIZE", DEFAULT_MIN_SIZE)):
+        return response
+
+    packed = compress(data, encoding)
+    if len(packed) >= len(data):
+        return response
+
+    response.set_data(packed)
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_app(app: Flask, enabled: bool = True) -> None:
+    if enabled:
+        app.after_request(compress_response)
@@ -0,0 +1,51 @@
+"""Условные GET (ETag / Last-Modified) для страниц курса и урока.
+
+ETag складывается из всего, от чего зависит HTML: версии курса,
+пользователя и его роли, состояния прогресса и RELEASE (шаблоны меняются
+с деплоем). Проверка идёт до рендеринга: при совпадении отдаётся 304 без
+обращения к шаблону и тяжёлому html_content.
+
+Cache-Control: private, no-cache — браузер хранит страницу, но каждый раз
+сверяется с сервером, поэтому устаревшей она не бывает.
+"""
+import hashlib
+from datetime import datetime
+from typing import Callable, Optional
+
+from flask import current_app, make_response, request, session
+from werkzeug.http import is_resource_modified
+
+from .settings import get_setting
+
+
+def page_etag(*parts) -> str:
+    raw = repr((get_setting("RELEASE", ""),) + parts).encode("utf-8")
+    return hashlib.sha1(raw).hexdigest()
+
+
+def latest(*stamps: Optional[datetime]) -> Optional[datetime]:
+    stamps = [s for s in stamps if s is not None]
+    return max(stamps).replace(microsecond=0) if stamps else None
+
+
+def conditional_page(etag: str, last_modified: Optional[datetime], render: Callable):
+    """304 без рендеринга, если у клиента актуальная версия; иначе render() с валидаторами.
+
+    Страница с флеш-сообщением рендерится всегда и без валидаторов:
+    сообщение показывается один раз и не должно остаться в кеше браузера.
+    """
+    if session.get("_flashes"):
+        return make_response(render())
+
+    if request.method == "GET" and not is_resource_modified(
+        request.environ, etag=etag, last_modified=last_modified
+    ):
+        response = current_app.response_class(status=304)
+    else:
+        response = make_response(render())
+
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
@@ -0,0 +1,138 @@
+"""Снимок теста для lesson_detail: вопросы и варианты одним запросом.
+
+В снимок не попадает is_correct — его можно отдавать в шаблон студенту.
+Ключ ответов для submit_test хранится отдельно. Оба кешируются в процессе
+по (lesson_id, content_version курса); add_question поднимает версию курса,
+и следующее обращение строит их заново.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from ..extensions import db
+from ..models.course import CourseTest, TestQuestion, TestOption
+from .cache import VersionedCache
+
+
+TEST_CACHE_SIZE = 256
+
+
+@dataclass(frozen=True)
+class OptionView:
+    id: int
+    option_text: str
+
+
+@dataclass(frozen=True)
+class QuestionView:
+    id: int
+    question: str
+    options: List[OptionView] = field(default_factory=list)
+
+
+@dataclass(frozen=True)
+class TestSnapshot:
+    id: int
+    title: str
+    description: Optional[str]
+    questions: List[QuestionView] = field(default_factory=list)
+
+
+_cache = VersionedCache(TEST_CACHE_SIZE)
+
+
+def load_test_snapshot(lesson_id: int) -> Optional[TestSnapshot]:
+    """Тест урока целиком — один запрос с LEFT JOIN вопросов и вариантов."""
+    rows = db.session.query(
+        CourseTest.id, CourseTest.title, CourseTest.description,
+        TestQuestion.id, TestQuestion.question,
+        TestOption.id, TestOption.option_text,
+    ).select_from(CourseTest).outerjoin(
+        TestQuestion, TestQuestion.test_id == CourseTest.id
+    ).outerjoin(
+        TestOption, TestOption.question_id == TestQuestion.id
+    ).filter(
+        CourseTest.lesson_id == lesson_id
+    ).order_by(
+        TestQuestion.order, TestQuestion.id, TestOption.order, TestOption.id
+    ).all()
+
+    if not rows:
+        return None
+
+    test_id, title, description = rows[0][0], rows[0][1], rows[0][2]
+    questions = []
+    by_id = {}
+    for _, _, _, q_id, q_text, o_id, o_text in rows:
+        if q_id is None:
+            continue
+        if q_id not in by_id:
+            by_id[q_id] = QuestionView(q_id, q_text, [])
+            questions.append(by_id[q_id])
+        if o_id is not None:
+            by_id[q_id].options.append(OptionView(o_id, o_text))
+
+    return TestSnapshot(test_id, title, description, questions)
+
+
+def get_test_snapshot(course, lesson_id: int) -> Optional[TestSnapshot]:
+    key = (lesson_id, course.content_version or 0)
+    return _cache.get_or_load(key, lambda: load_test_snapshot(lesson_id))
+
+
+@dataclass(frozen=True)
+class AnswerKey:
+    """question_id -> множество id верных вариантов (в порядке вопросов теста)."""
+    test_id: int
+    correct: Dict[int, FrozenSet[int]]
+
+    def grade(self, answers: Dict[int, List[int]]) -> Tuple[int, int]:
+        """Проверить ответы {question_id: [option_id, ...]} в памяти: (верных, всего).
+
+        Вопрос с одним верным вариантом засчитывается, если первым выбран он
+        (как раньше для radio). Если верных несколько — нужен точный набор.
+        """
+        score = 0
+        for question_id, correct_ids in self.correct.items():
+            selected = answers.get(question_id) or []
+            if not selected or not correct_ids:
+                continue
+            if len(correct_ids) == 1:
+                if selected[0] in correct_ids:
+                    score += 1
+            elif set(selected) == correct_ids:
+                score += 1
+        return score, len(self.correct)
+
+
+_keys = VersionedCache(TEST_CACHE_SIZE)
+
+
+def load_answer_key(lesson_id: int) -> Optional[AnswerKey]:
+    """Ключ ответов теста урока одним запросом."""
+    rows = db.session.query(
+        CourseTest.id, TestQuestion.id, TestOption.id, TestOption.is_correct,
+    ).select_from(CourseTest).outerjoin(
+        TestQuestion, TestQuestion.test_id == CourseTest.id
+    ).outerjoin(
+        TestOption, TestOption.question_id == TestQuestion.id
+    ).filter(
+        CourseTest.lesson_id == lesson_id
+    ).order_by(TestQuestion.order, TestQuestion.id).all()
+
+    if not rows:
+        return None
+
+    correct = {}
+    for _, q_id, o_id, is_correct in rows:
+        if q_id is None:
+            continue
+        ids = correct.setdefault(q_id, set())
+        if o_id is not None and is_correct:
+            ids.add(o_id)
+
+    return AnswerKey(rows[0][0], {q_id: frozenset(ids) for q_id, ids in correct.items()})
+
+
+def get_answer_key(course, lesson_id: int) -> Optional[AnswerKey]:
+    key = (lesson_id, course.content_version or 0)
+    return _keys.get_or_load(key, lambda: load_answer_key(lesson_id))
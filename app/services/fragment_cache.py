@@ -0,0 +1,120 @@
+"""Кеш фрагментов шаблонов: {% cache ключ, ... %}...{% endcache %}.
+
+    {% cache "course-modules", course.id, course.content_version, current_user.status %}
+      ...циклы по модулям и урокам...
+    {% endcache %}
+
+Ключ — все выражения после cache и RELEASE (как у page_etag: после
+деплоя общее хранилище не отдаёт разметку старых шаблонов). Версию данных нужно класть в ключ
+самому (как content_version курса): при её росте старые фрагменты просто
+перестают запрашиваться, явная инвалидация не нужна. Во фрагмент нельзя
+класть то, что отличается у пользователей с одинаковым ключом (флеш,
+личный прогресс).
+
+Хранилище подключаемое: объект с методами get(key) -> str | None и
+set(key, value, timeout). По умолчанию — MemoryStore, LRU в памяти
+процесса на FRAGMENT_CACHE_SIZE записей. Своё хранилище (например, общее
+для воркеров) задаётся в FRAGMENT_CACHE_STORE — объектом или строкой
+"модуль:фабрика". FRAGMENT_CACHE_ENABLED=0 выключает кеш: тело
+рендерится каждый раз.
+"""
+import hashlib
+import importlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from flask import Flask
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from .settings import get_setting
+
+
+DEFAULT_SIZE = 1024
+DEFAULT_TTL = 3600
+
+
+class MemoryStore:
+    """Потокобезопасный LRU с временем жизни записей."""
+
+    def __init__(self, maxsize: int = DEFAULT_SIZE):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[1] <= now:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: str, value: str, timeout: int) -> None:
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + timeout)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class FragmentCacheExtension(Extension):
+    tags = {"cache"}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=None, fragment_cache_timeout=DEFAULT_TTL)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method("_cache", [nodes.List(parts)]), [], [], body,
+        ).set_lineno(lineno)
+
+    def _cache(self, parts, caller):
+        store = self.environment.fragment_cache
+        if store is None:
+            return caller()
+        raw = repr((get_setting("RELEASE", ""),) + tuple(parts)).encode("utf-8")
+        key = "fragment:" + hashlib.sha1(raw).hexdigest()
+        value = store.get(key)
+        if value is None:
+            value = caller()
+            store.set(key, str(value), self.environment.fragment_cache_timeout)
+        # внешнее хранилище вернёт str — без Markup автоэкранирование испортит HTML
+        return Markup(value)
+
+
+def _load_store(spec):
+    if not isinstance(spec, str):
+        return spec
+    module, _, factory = spec.partition(":")
+    return getattr(importlib.import_module(module), factory)()
+
+
+def init_app(app: Flask, enabled: bool = True) -> None:
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    if not enabled:
+        return
+    with app.app_context():
+        spec = get_setting("FRAGMENT_CACHE_STORE")
+        size = int(get_setting("FRAGMENT_CACHE_SIZE", DEFAULT_SIZE))
+        timeout = int(get_setting("FRAGMENT_CACHE_TTL", DEFAULT_TTL))
+    app.jinja_env.fragment_cache = _load_store(spec) if spec else MemoryStore(size)
+    app.jinja_env.fragment_cache_timeout = timeout
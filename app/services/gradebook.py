@@ -0,0 +1,141 @@
+"""Сводная ведомость курса: статистика по всем студентам фиксированным числом запросов."""
+from collections import defaultdict
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import case, func
+
+from ..extensions import db
+from ..models.course import (
+    CourseModule, CourseLesson, LessonType,
+    TestAttempt, LabAttempt, StudentProgress,
+)
+
+
+def course_lessons(course_id: int):
+    """id уроков курса, разложенные по типам (один запрос)."""
+    rows = db.session.query(CourseLesson.id, CourseLesson.lesson_type).join(CourseModule).filter(
+        CourseModule.course_id == course_id
+    ).order_by(CourseLesson.id).all()
+
+    by_type = {t.value: [] for t in LessonType}
+    for lesson_id, lesson_type in rows:
+        if lesson_type in by_type:
+            by_type[lesson_type].append(lesson_id)
+    return by_type["lecture"], by_type["test"], by_type["lab"]
+
+
+def _lectures_done(course_id: int, lecture_ids, student_ids) -> Dict[int, int]:
+    if not lecture_ids:
+        return {}
+    rows = db.session.query(
+        StudentProgress.student_id, func.count(StudentProgress.id)
+    ).filter(
+        StudentProgress.course_id == course_id,
+        StudentProgress.completed.is_(True),
+        StudentProgress.lesson_id.in_(lecture_ids),
+        StudentProgress.student_id.in_(student_ids),
+    ).group_by(StudentProgress.student_id).all()
+    return dict(rows)
+
+
+def _best_test_ratios(test_ids, student_ids) -> Dict[int, Dict[int, float]]:
+    """student_id -> {lesson_id: лучший score/total}.
+
+    Группируем по уникальным парам (score, total), а отношение считаем в Python
+    тем же выражением, что и раньше, — итоговый балл совпадает до бита.
+    """
+    best = defaultdict(dict)
+    if not test_ids:
+        return best
+    rows = db.session.query(
+        TestAttempt.student_id, TestAttempt.lesson_id, TestAttempt.score, TestAttempt.total
+    ).filter(
+        TestAttempt.lesson_id.in_(test_ids),
+        TestAttempt.student_id.in_(student_ids),
+    ).group_by(
+        TestAttempt.student_id, TestAttempt.lesson_id, TestAttempt.score, TestAttempt.total
+    ).all()
+
+    for student_id, lesson_id, score, total in rows:
+        ratio = score / total if total else 0.0
+        per_student = best[student_id]
+        if ratio > per_student.get(lesson_id, -1.0):
+            per_student[lesson_id] = ratio
+    return best
+
+
+def _lab_totals(lab_ids, student_ids) -> Dict[int, tuple]:
+    """student_id -> (решено лаб, всего попыток)."""
+    if not lab_ids:
+        return {}
+    solved_lesson = case((LabAttempt.is_correct.is_(True), LabAttempt.lesson_id))
+    rows = db.session.query(
+        LabAttempt.student_id,
+        func.count(func.distinct(solved_lesson)),
+        func.count(LabAttempt.id),
+    ).filter(
+        LabAttempt.lesson_id.in_(lab_ids),
+        LabAttempt.student_id.in_(student_ids),
+    ).group_by(LabAttempt.student_id).all()
+    return {student_id: (solved, attempts) for student_id, solved, attempts in rows}
+
+
+def summarize_stats(lecture_ids, test_ids, lab_ids, lectures_done: int,
+                    best_ratios: Dict[int, float], labs_solved: int,
+                    lab_attempts_total: int) -> dict:
+    """Итоговый словарь статистики и балл из уже посчитанных величин."""
+    lectures_total = len(lecture_ids)
+    tests_total = len(test_ids)
+    labs_total = len(lab_ids)
+
+    test_quality_ratio = 1.0
+    if tests_total > 0:
+        ratios = [best_ratios.get(lid, 0.0) for lid in test_ids]
+        test_quality_ratio = sum(ratios) / len(ratios)
+
+    lectures_ratio = lectures_done / lectures_total if lectures_total else 1.0
+    tests_ratio = test_quality_ratio
+    labs_ratio = labs_solved / labs_total if labs_total else 1.0
+
+    final_score = round((lectures_ratio + tests_ratio + labs_ratio) / 3 * 10, 1)
+
+    return {
+        "lectures_done": lectures_done,
+        "lectures_total": lectures_total,
+        "tests_total": tests_total,
+        "tests_ratio": tests_ratio,
+        "labs_total": labs_total,
+        "labs_solved": labs_solved,
+        "lab_attempts_total": lab_attempts_total,
+        "final_score": final_score,
+    }
+
+
+def compute_course_gradebook(course_id: int, student_ids: Iterable[int],
+                             lessons: Optional[tuple] = None) -> Dict[int, dict]:
+    """Статистика курса для набора студентов: student_id -> dict.
+
+    Формат словаря и итоговый балл такие же, как у
+    ``compute_course_stats_for_student``, но число запросов не зависит
+    ни от количества студентов, ни от количества уроков.
+    """
+    student_ids = list(student_ids)
+    lecture_ids, test_ids, lab_ids = lessons if lessons is not None else course_lessons(course_id)
+    if not student_ids:
+        return {}
+
+    lectures = _lectures_done(course_id, lecture_ids, student_ids)
+    tests = _best_test_ratios(test_ids, student_ids)
+    labs = _lab_totals(lab_ids, student_ids)
+
+    result = {}
+    for student_id in student_ids:
+        labs_solved, lab_attempts_total = labs.get(student_id, (0, 0))
+        result[student_id] = summarize_stats(
+            lecture_ids, test_ids, lab_ids,
+            lectures_done=lectures.get(student_id, 0),
+            best_ratios=tests.get(student_id, {}),
+            labs_solved=labs_solved,
+            lab_attempts_total=lab_attempts_total,
+        )
+    return result
@@ -0,0 +1,106 @@
+"""Кеш «личности» текущего пользователя для Flask-Login.
+
+user_loader вызывается на каждом запросе; вместо SELECT по user он берёт
+id, status, name, login и email из кеша процесса (IDENTITY_CACHE_TTL
+секунд). current_user — лёгкий Identity; обращение к любому другому
+атрибуту (courses, enroll_in_course, ...) один раз за запрос подгружает
+настоящего User.
+
+Запись сбрасывается после commit, который удалил пользователя или поменял
+эти поля; другие воркеры увидят изменение не позже чем через TTL.
+"""
+import threading
+import time
+from typing import Optional
+
+from flask_login import UserMixin
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+from ..extensions import db
+from ..models.user import User
+from .settings import get_setting
+
+
+DEFAULT_TTL = 30
+
+FIELDS = ("id", "status", "name", "login", "email")
+
+_identities = {}
+_identities_lock = threading.Lock()
+
+
+class Identity(UserMixin):
+    def __init__(self, data: dict):
+        self.__dict__.update(data)
+
+    def _user(self) -> Optional[User]:
+        user = self.__dict__.get("_loaded")
+        if user is None:
+            user = db.session.get(User, self.id)
+            self.__dict__["_loaded"] = user
+        return user
+
+    def __getattr__(self, name):
+        # сюда попадаем только за атрибутами, которых нет в кеше
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return getattr(self._user(), name)
+
+    def __eq__(self, other):
+        if isinstance(other, (Identity, User)):
+            return self.id == other.id
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(("user", self.id))
+
+    def __repr__(self):
+        return f"<Identity {self.id} {self.status}>"
+
+
+def load_identity(user_id: int) -> Optional[Identity]:
+    now = time.monotonic()
+    with _identities_lock:
+        entry = _identities.get(user_id)
+    if entry is not None and entry[1] > now:
+        return Identity(entry[0])
+
+    user = db.session.get(User, user_id)
+    if user is None:
+        return None
+    data = {field: getattr(user, field) for field in FIELDS}
+    ttl = float(get_setting("IDENTITY_CACHE_TTL", DEFAULT_TTL))
+    with _identities_lock:
+        _identities[user_id] = (data, now + ttl)
+    return Identity(data)
+
+
+def invalidate_identity(user_id: Optional[int] = None) -> None:
+    with _identities_lock:
+        if user_id is None:
+            _identities.clear()
+        else:
+            _identities.pop(user_id, None)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _on_user_change(mapper, connection, target):
+    state = inspect(target)
+    if not state.deleted and not any(state.attrs[f].history.has_changes() for f in FIELDS):
+        return
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("identity_ids", set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    for user_id in session.info.pop("identity_ids", ()):
+        invalidate_identity(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    session.info.pop("identity_ids", None)
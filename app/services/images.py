@@ -0,0 +1,512 @@
+"""Загрузка картинок: проверка, очистка метаданных, уменьшенные копии.
+
+prepare() декодирует файл Pillow и отклоняет всё, что не открывается как
+PNG/JPEG/GIF/WebP или больше IMAGE_MAX_PIXELS. Картинка пересохраняется
+без EXIF/XMP/комментариев (поворот из EXIF применяется к пикселям),
+расширение берётся из настоящего формата, а не из имени файла.
+
+Уменьшенные копии шириной IMAGE_VARIANT_WIDTHS — в WebP и в JPEG/PNG для
+старых браузеров — строятся после коммита в пуле процессов: ресайз —
+чистый CPU, в потоках воркера он держал бы GIL и тормозил соседние
+запросы. Готовые копии записываются в UploadedImage.variants, по ним
+шаблоны строят <picture> со srcset (макрос picture в _image.html). Пока
+копий нет, отдаётся оригинал.
+
+Файлы хранятся по хешу содержимого (уже очищенного):
+static/uploads/ab/cd/<sha256>.<ext>, копии — рядом. Одинаковые загрузки
+дают один файл и одну запись UploadedImage, а кто её использует, видно
+по UploadRef. Имя файла однозначно определяет содержимое, поэтому nginx
+отдаёт такие пути с Cache-Control: immutable.
+
+Старые фото из uploads/courses и uploads/teachers переносит flask images
+process, картинки без ссылок удаляет flask images gc.
+"""
+import hashlib
+import io
+import multiprocessing
+import os
+import posixpath
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, object_session
+
+from ..extensions import db
+from ..models.image import UploadedImage, UploadRef
+from ..models.post import Post
+from ..models.teacher import Teacher
+from .settings import get_setting
+
+
+DEFAULT_WIDTHS = (320, 640, 960, 1280)
+DEFAULT_MAX_PIXELS = 40_000_000
+DEFAULT_QUALITY = 80
+DEFAULT_WORKERS = 1
+DEFAULT_TTL = 300
+DEFAULT_GC_GRACE = 24 * 3600
+
+# формат Pillow -> (расширение, mime)
+FORMATS = {
+    "JPEG": (".jpg", "image/jpeg"),
+    "PNG": (".png", "image/png"),
+    "GIF": (".gif", "image/gif"),
+    "WEBP": (".webp", "image/webp"),
+}
+
+# из info оставляем только то, без чего картинка выглядит иначе
+_KEEP_INFO = ("icc_profile", "transparency", "duration", "loop")
+
+
+class ImageRejected(ValueError):
+    """Файл не картинка, формат не поддерживается или картинка слишком велика."""
+
+
+@dataclass(frozen=True)
+class CleanImage:
+    data: bytes
+    format: str
+    width: int
+    height: int
+
+    @property
+    def ext(self) -> str:
+        return FORMATS[self.format][0]
+
+
+def _widths() -> Tuple[int, ...]:
+    value = get_setting("IMAGE_VARIANT_WIDTHS", DEFAULT_WIDTHS)
+    if isinstance(value, str):
+        value = [v for v in value.replace(" ", "").split(",") if v]
+    return tuple(sorted({int(v) for v in value}))
+
+
+def _quality() -> int:
+    return int(get_setting("IMAGE_QUALITY", DEFAULT_QUALITY))
+
+
+def _decode(data: bytes):
+    from PIL import Image
+
+    max_pixels = int(get_setting("IMAGE_MAX_PIXELS", DEFAULT_MAX_PIXELS))
+    try:
+        with Image.open(io.BytesIO(data)) as probe:
+            fmt = probe.format
+            width, height = probe.size
+            probe.verify()
+    except Exception as e:
+        # verify() на битых файлах бросает что угодно, от OSError до SyntaxError
+        raise ImageRejected("Файл не является изображением") from e
+
+    if fmt not in FORMATS:
+        raise ImageRejected(f"Формат {fmt} не поддерживается")
+    if width * height > max_pixels:
+        raise ImageRejected("Изображение слишком большое")
+
+    try:
+        img = Image.open(io.BytesIO(data))
+        img.load()
+    except Exception as e:
+        raise ImageRejected("Файл не является изображением") from e
+    return img, fmt
+
+
+def prepare(stream) -> CleanImage:
+    """Прочитать загруженный файл, проверить его и пересобрать без метаданных."""
+    from PIL import ImageOps
+
+    img, fmt = _decode(stream.read())
+    animated = getattr(img, "is_animated", False)
+    if not animated:
+        img = ImageOps.exif_transpose(img)
+    img.info = {key: img.info[key] for key in _KEEP_INFO if key in img.info}
+
+    params = {}
+    if fmt == "JPEG":
+        if img.mode not in ("RGB", "L", "CMYK"):
+            img = img.convert("RGB")
+        params = {"quality": 90, "optimize": True, "progressive": True}
+    elif fmt == "PNG":
+        params = {"optimize": True}
+    elif fmt == "WEBP":
+        params = {"quality": 90, "save_all": animated}
+    elif fmt == "GIF":
+        params = {"save_all": animated}
+    if "icc_profile" in img.info:
+        params["icc_profile"] = img.info["icc_profile"]
+
+    out = io.BytesIO()
+    img.save(out, fmt, **params)
+    return CleanImage(data=out.getvalue(), format=fmt, width=img.width, height=img.height)
+
+
+def _static_path(path: str) -> str:
+    return os.path.join(current_app.static_folder, *path.split("/"))
+
+
+def _write(path: str, data: bytes) -> None:
+    target = _static_path(path)
+    if os.path.exists(target):
+        return
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    # пишем во временный файл и переименовываем: nginx не должен увидеть половину файла
+    tmp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, target)
+
+
+def store(image: CleanImage, schedule: bool = True) -> UploadedImage:
+    """Положить картинку в хранилище по хешу и вернуть её UploadedImage.
+
+    Если такое содержимое уже есть, возвращается существующая запись. Для
+    новой записи при schedule=True копии начнут строиться после коммита.
+    """
+    digest = hashlib.sha256(image.data).hexdigest()
+    record = UploadedImage.query.filter_by(sha256=digest).first()
+    if record is not None:
+        if record.status == UploadedImage.FAILED and schedule:
+            db.session.info.setdefault("images_pending", set()).add(record.path)
+        return record
+
+    path = f"uploads/{digest[:2]}/{digest[2:4]}/{digest}{image.ext}"
+    _write(path, image.data)
+    record = UploadedImage(
+        path=path, sha256=digest, format=image.format, width=image.width, height=image.height,
+        size=len(image.data), status=UploadedImage.PENDING, variants=[],
+    )
+    try:
+        with db.session.begin_nested():
+            db.session.add(record)
+    except IntegrityError:
+        # тот же файл параллельно загрузили в другом запросе
+        return UploadedImage.query.filter_by(sha256=digest).one()
+
+    if schedule:
+        db.session.info.setdefault("images_pending", set()).add(path)
+    return record
+
+
+def save_upload(file) -> UploadedImage:
+    """Проверить загруженный файл и положить его в хранилище.
+
+    record.path — путь относительно static (для Post.photo и url_for('static')).
+    Ссылку на картинку нужно завести через attach().
+    """
+    return store(prepare(file.stream))
+
+
+def attach(record: UploadedImage, kind: str, owner_id: int) -> None:
+    exists = UploadRef.query.filter_by(image_id=record.id, kind=kind, owner_id=owner_id).first()
+    if exists is None:
+        db.session.add(UploadRef(image=record, kind=kind, owner_id=owner_id))
+
+
+def detach(kind: str, owner_id: int) -> None:
+    """Убрать ссылки владельца; сами файлы удалит collect_garbage()."""
+    UploadRef.query.filter_by(kind=kind, owner_id=owner_id).delete(synchronize_session=False)
+
+
+def _remove_files(record: UploadedImage) -> None:
+    for path in [record.path] + [v["path"] for v in record.variants or ()]:
+        try:
+            os.remove(_static_path(path))
+        except FileNotFoundError:
+            pass
+
+
+def collect_garbage(grace: Optional[int] = None) -> int:
+    """Удалить картинки из хранилища, на которые никто не ссылается.
+
+    Свежие (моложе IMAGE_GC_GRACE секунд) не трогаем: файл уже записан, а
+    ссылка появится только с коммитом формы. Возвращает число удалённых.
+    """
+    if grace is None:
+        grace = int(get_setting("IMAGE_GC_GRACE", DEFAULT_GC_GRACE))
+    cutoff = datetime.utcnow() - timedelta(seconds=grace)
+    orphans = UploadedImage.query.filter(
+        UploadedImage.sha256.isnot(None),
+        UploadedImage.created_at < cutoff,
+        ~UploadedImage.refs.any(),
+    ).all()
+    for record in orphans:
+        db.session.delete(record)
+    db.session.commit()
+    # файлы — только после коммита: при откате записи должны остаться целыми
+    for record in orphans:
+        _remove_files(record)
+    return len(orphans)
+
+
+def render_variants(source: str, widths: Tuple[int, ...], quality: int) -> List[dict]:
+    """Построить копии source рядом с ним. Выполняется в дочернем процессе.
+
+    Возвращает [{"file", "width", "type"}], file — имя файла без каталога.
+    Анимированные картинки не трогаем.
+    """
+    from PIL import Image
+
+    stem = os.path.splitext(source)[0]
+    variants = []
+    with Image.open(source) as img:
+        if getattr(img, "is_animated", False):
+            return variants
+        img.load()
+        icc = img.info.get("icc_profile")
+        alpha = img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info
+        base = img.convert("RGBA" if alpha else "RGB")
+
+    # без прозрачности запасной вариант — JPEG, он в разы меньше PNG того же размера
+    fallback, fallback_ext, fallback_type = ("PNG", ".png", "image/png") if alpha else ("JPEG", ".jpg", "image/jpeg")
+    fallback_params = {"optimize": True} if alpha else {"quality": quality, "optimize": True, "progressive": True}
+    extra = {"icc_profile": icc} if icc else {}
+
+    targets = [w for w in widths if w < base.width]
+    if not widths or base.width <= widths[-1]:
+        targets.append(base.width)
+
+    for width in targets:
+        height = max(1, round(base.height * width / base.width))
+        resized = base if width == base.width else base.resize((width, height), Image.Resampling.LANCZOS)
+        name = f"{stem}-{width}w"
+        resized.save(name + ".webp", "WEBP", quality=quality, method=6, **extra)
+        resized.save(name + fallback_ext, fallback, **fallback_params, **extra)
+        variants.append({"file": os.path.basename(name) + ".webp", "width": width, "type": "image/webp"})
+        variants.append({"file": os.path.basename(name) + fallback_ext, "width": width, "type": fallback_type})
+    return variants
+
+
+# --- пул процессов -----------------------------------------------------------
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor, _executor_pid
+    pid = os.getpid()
+    with _executor_lock:
+        if _executor is None or _executor_pid != pid:
+            workers = int(get_setting("IMAGE_WORKERS", DEFAULT_WORKERS))
+            # spawn, а не fork: форк многопоточного воркера gunicorn копирует
+            # чужие захваченные блокировки
+            _executor = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+            )
+            _executor_pid = pid
+    return _executor
+
+
+def _reset_executor(broken: ProcessPoolExecutor) -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is broken:
+            _executor = None
+    broken.shutdown(wait=False)
+
+
+def _submit(path: str):
+    source = _static_path(path)
+    executor = _get_executor()
+    try:
+        return executor.submit(render_variants, source, _widths(), _quality())
+    except BrokenProcessPool:
+        # дочерний процесс умер (например, OOM на огромной картинке) — такой пул
+        # больше ничего не принимает, поднимаем новый
+        _reset_executor(executor)
+        return _get_executor().submit(render_variants, source, _widths(), _quality())
+
+
+def _apply(path: str, future) -> Optional[UploadedImage]:
+    record = UploadedImage.query.filter_by(path=path).first()
+    if record is None:
+        return None
+    try:
+        found = future.result()
+    except Exception:
+        current_app.logger.exception("image variants for %s failed", path)
+        record.status = UploadedImage.FAILED
+    else:
+        folder = posixpath.dirname(path)
+        record.variants = [
+            {"path": f"{folder}/{v['file']}", "width": v["width"], "type": v["type"]} for v in found
+        ]
+        record.status = UploadedImage.READY
+    db.session.commit()
+    return record
+
+
+def _on_done(app, path: str, future) -> None:
+    with app.app_context():
+        try:
+            _apply(path, future)
+        except Exception:
+            app.logger.exception("saving image variants for %s failed", path)
+        finally:
+            db.session.remove()
+
+
+def schedule(path: str) -> None:
+    app = current_app._get_current_object()
+    _submit(path).add_done_callback(lambda future: _on_done(app, path, future))
+
+
+def _migrate(path: str, owners) -> Optional[UploadedImage]:
+    """Перенести старое фото в хранилище и переписать ссылки владельцев."""
+    with open(_static_path(path), "rb") as f:
+        record = store(prepare(f), schedule=False)
+    for owner, kind in owners:
+        owner.photo = record.path
+        attach(record, kind, owner.id)
+    UploadedImage.query.filter(
+        UploadedImage.path == path, UploadedImage.sha256.is_(None),
+    ).delete(synchronize_session=False)
+    return record
+
+
+def process_existing(rebuild: bool = False) -> Iterator[Tuple[str, str]]:
+    """Перенести фото курсов и преподавателей из старых uploads/courses и
+    uploads/teachers в хранилище по хешу и синхронно построить недостающие
+    копии. Старые файлы остаются на месте. Выдаёт (путь, итог)."""
+    legacy = {}
+    for model, kind in ((Post, UploadRef.COURSE), (Teacher, UploadRef.TEACHER)):
+        for owner in model.query.filter(model.photo.like("uploads/%")):
+            if not _is_stored(owner.photo):
+                legacy.setdefault(owner.photo, []).append((owner, kind))
+
+    for path, owners in sorted(legacy.items()):
+        try:
+            record = _migrate(path, owners)
+        except (OSError, ImageRejected) as e:
+            yield path, f"skipped: {e}"
+            continue
+        yield path, f"-> {record.path}"
+    db.session.commit()
+
+    query = UploadedImage.query.filter(UploadedImage.sha256.isnot(None))
+    if not rebuild:
+        query = query.filter(UploadedImage.status != UploadedImage.READY)
+    futures = [(record.path, _submit(record.path)) for record in query]
+    for path, future in futures:
+        record = _apply(path, future)
+        if record.status == UploadedImage.READY:
+            yield path, f"{len(record.variants)} variants"
+        else:
+            yield path, "failed"
+
+
+def _is_stored(path: str) -> bool:
+    parts = path.split("/")
+    return len(parts) == 4 and len(parts[1]) == 2 and len(parts[2]) == 2 and parts[3].startswith(parts[1] + parts[2])
+
+
+# --- варианты для шаблонов ---------------------------------------------------
+
+@dataclass(frozen=True)
+class Variant:
+    path: str
+    width: int
+    type: str
+
+
+@dataclass(frozen=True)
+class ImageInfo:
+    path: str
+    width: int
+    height: int
+    variants: Tuple[Variant, ...]
+
+    def sources(self, type_: str) -> List[Variant]:
+        return [v for v in self.variants if v.type == type_]
+
+    @property
+    def fallback_type(self) -> str:
+        return next((v.type for v in self.variants if v.type != "image/webp"), "image/webp")
+
+    @property
+    def src(self) -> str:
+        """Самая крупная копия запасного формата — для браузеров без srcset."""
+        fallback = self.sources(self.fallback_type)
+        return max(fallback, key=lambda v: v.width).path if fallback else self.path
+
+
+_cache: Dict[str, Tuple[Optional[ImageInfo], float]] = {}
+_cache_lock = threading.Lock()
+
+
+def _info(record: UploadedImage) -> Optional[ImageInfo]:
+    if record.status != UploadedImage.READY or not record.variants:
+        return None
+    return ImageInfo(
+        path=record.path, width=record.width, height=record.height,
+        variants=tuple(Variant(v["path"], v["width"], v["type"]) for v in record.variants),
+    )
+
+
+def prefetch(paths: Iterable[Optional[str]]) -> None:
+    """Загрузить в кеш варианты для всех paths одним запросом (перед циклом в шаблоне)."""
+    now = time.monotonic()
+    with _cache_lock:
+        missing = {p for p in paths if p and not (p in _cache and _cache[p][1] > now)}
+    if not missing:
+        return
+
+    found = {r.path: _info(r) for r in UploadedImage.query.filter(UploadedImage.path.in_(missing))}
+    expires = now + float(get_setting("IMAGE_CACHE_TTL", DEFAULT_TTL))
+    with _cache_lock:
+        for path in missing:
+            _cache[path] = (found.get(path), expires)
+
+
+def image_info(path: Optional[str]) -> Optional[ImageInfo]:
+    """Готовые копии картинки static/<path> или None, если их нет (template global)."""
+    if not path:
+        return None
+    with _cache_lock:
+        entry = _cache.get(path)
+    if entry is None or entry[1] <= time.monotonic():
+        prefetch([path])
+        with _cache_lock:
+            entry = _cache.get(path)
+    return entry[0] if entry else None
+
+
+def invalidate(paths: Optional[Iterable[str]] = None) -> None:
+    with _cache_lock:
+        if paths is None:
+            _cache.clear()
+        else:
+            for path in paths:
+                _cache.pop(path, None)
+
+
+@event.listens_for(UploadedImage, "after_insert")
+@event.listens_for(UploadedImage, "after_update")
+@event.listens_for(UploadedImage, "after_delete")
+def _on_image_change(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("images_dirty", set()).add(target.path)
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    dirty = session.info.pop("images_dirty", None)
+    if dirty:
+        invalidate(dirty)
+    for path in session.info.pop("images_pending", ()):
+        schedule(path)
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    session.info.pop("images_dirty", None)
+    session.info.pop("images_pending", None)
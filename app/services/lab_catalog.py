@@ -0,0 +1,142 @@
+"""Каталог лабораторных: LabDefinition, синхронизированные с sandbox-manager.
+
+sync_catalog() одним запросом забирает список лаб и флагов и пачкой
+обновляет LabDefinition (запускается по cron: flask labs sync). Маршруты
+читают только локальный кеш процесса — выпадающие списки slug и проверка
+slug при сохранении урока не ходят ни в сеть, ни (чаще раза в
+LAB_CATALOG_CACHE_TTL секунд) в БД.
+"""
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from ..extensions import db
+from ..models.course import LabDefinition
+from . import sandbox_client
+from .lab_flags import invalidate_flag
+from .settings import get_setting
+
+
+DEFAULT_TTL = 60
+
+
+@dataclass(frozen=True)
+class CatalogLab:
+    slug: str
+    title: str
+
+
+_catalog = None
+_catalog_expires = 0.0
+_catalog_lock = threading.Lock()
+
+
+def _load() -> Tuple[CatalogLab, ...]:
+    rows = db.session.query(LabDefinition.slug, LabDefinition.title).filter(
+        LabDefinition.available.is_(True),
+    ).order_by(LabDefinition.slug).all()
+    return tuple(CatalogLab(slug=slug, title=title or slug) for slug, title in rows)
+
+
+def lab_catalog() -> Tuple[CatalogLab, ...]:
+    """Доступные лабы для выпадающих списков, отсортированы по slug."""
+    global _catalog, _catalog_expires
+    now = time.monotonic()
+    with _catalog_lock:
+        if _catalog is not None and _catalog_expires > now:
+            return _catalog
+
+    labs = _load()
+    ttl = float(get_setting("LAB_CATALOG_CACHE_TTL", DEFAULT_TTL))
+    with _catalog_lock:
+        _catalog, _catalog_expires = labs, now + ttl
+    return labs
+
+
+def invalidate_catalog() -> None:
+    global _catalog
+    with _catalog_lock:
+        _catalog = None
+
+
+@event.listens_for(LabDefinition, "after_insert")
+@event.listens_for(LabDefinition, "after_update")
+@event.listens_for(LabDefinition, "after_delete")
+def _on_definition_change(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info["lab_catalog_dirty"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    if session.info.pop("lab_catalog_dirty", False):
+        invalidate_catalog()
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    session.info.pop("lab_catalog_dirty", None)
+
+
+def is_known_slug(slug: str) -> bool:
+    return any(lab.slug == slug for lab in lab_catalog())
+
+
+def validate_slug(slug: str) -> Optional[str]:
+    """Текст ошибки для формы или None, если slug есть в каталоге."""
+    if not slug:
+        return "Выберите лабораторную из каталога"
+    if not is_known_slug(slug):
+        return f"Лабораторная «{slug}» не найдена в каталоге песочниц"
+    return None
+
+
+def sync_catalog() -> dict:
+    """Загрузить каталог из sandbox-manager и пачкой обновить LabDefinition. Коммитит.
+
+    Лабы, пропавшие из каталога, помечаются available=False; записи,
+    заведённые вручную (synced_at пустой), не трогаются.
+    """
+    remote = {}
+    for item in sandbox_client.list_labs():
+        slug = (item.get("slug") or "").strip()
+        if slug:
+            remote[slug] = item
+
+    now = datetime.utcnow()
+    existing = {d.slug: d for d in LabDefinition.query.all()}
+
+    inserts, updates = [], []
+    for slug, item in remote.items():
+        values = {"title": item.get("title") or slug, "available": True, "synced_at": now}
+        if item.get("flag"):
+            values["correct_flag"] = item["flag"]
+        current = existing.get(slug)
+        if current is None:
+            values.setdefault("correct_flag", "")
+            inserts.append(dict(values, slug=slug))
+        else:
+            updates.append(dict(values, id=current.id))
+
+    hidden = [
+        {"id": d.id, "available": False}
+        for slug, d in existing.items()
+        if slug not in remote and d.synced_at is not None and d.available
+    ]
+
+    if inserts:
+        db.session.bulk_insert_mappings(LabDefinition, inserts)
+    if updates or hidden:
+        db.session.bulk_update_mappings(LabDefinition, updates + hidden)
+    db.session.commit()
+
+    # пакетные операции не вызывают ORM-события — сбрасываем кеши сами
+    invalidate_flag()
+    invalidate_catalog()
+    return {"added": len(inserts), "updated": len(updates), "hidden": len(hidden)}
@@ -0,0 +1,94 @@
+"""Кеш правильных флагов лабораторных (LabDefinition) в памяти процесса.
+
+Флаги хранятся не открытым текстом, а в виде SHA-256, и сравниваются
+через hmac.compare_digest. Запись сбрасывается после commit, изменившего
+LabDefinition в этом процессе; остальные воркеры увидят изменение не
+позже чем через LAB_FLAG_CACHE_TTL секунд.
+"""
+import hashlib
+import hmac
+import threading
+import time
+from typing import Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+from ..models.course import LabDefinition
+from .settings import get_setting
+
+
+DEFAULT_TTL = 300
+
+_MISSING = object()
+
+_flags = {}
+_flags_lock = threading.Lock()
+
+
+def _digest(flag: str) -> bytes:
+    return hashlib.sha256(flag.strip().encode("utf-8")).digest()
+
+
+def _load(slug: str) -> Optional[bytes]:
+    row = LabDefinition.query.with_entities(LabDefinition.correct_flag).filter_by(slug=slug).first()
+    # из каталога лаба может прийти без флага — тогда проверять нечем
+    if row is None or not (row.correct_flag or "").strip():
+        return None
+    return _digest(row.correct_flag)
+
+
+def flag_digest(slug: str) -> Optional[bytes]:
+    """Хеш правильного флага лабы или None, если LabDefinition нет."""
+    now = time.monotonic()
+    with _flags_lock:
+        entry = _flags.get(slug, _MISSING)
+    if entry is not _MISSING and entry[1] > now:
+        return entry[0]
+
+    digest = _load(slug)
+    ttl = float(get_setting("LAB_FLAG_CACHE_TTL", DEFAULT_TTL))
+    with _flags_lock:
+        _flags[slug] = (digest, now + ttl)
+    return digest
+
+
+def check_flag(slug: str, submitted: str) -> Optional[bool]:
+    """Сравнить флаг за постоянное время. None — для slug не задан правильный флаг."""
+    expected = flag_digest(slug)
+    if expected is None:
+        return None
+    return hmac.compare_digest(_digest(submitted), expected)
+
+
+def invalidate_flag(slug: Optional[str] = None) -> None:
+    with _flags_lock:
+        if slug is None:
+            _flags.clear()
+        else:
+            _flags.pop(slug, None)
+
+
+@event.listens_for(LabDefinition, "after_insert")
+@event.listens_for(LabDefinition, "after_update")
+@event.listens_for(LabDefinition, "after_delete")
+def _on_definition_change(mapper, connection, target):
+    # сбрасываем после commit: иначе соседний запрос успел бы закешировать старый флаг
+    session = object_session(target)
+    if session is None:
+        return
+    slugs = session.info.setdefault("lab_flag_slugs", set())
+    slugs.add(target.slug)
+    # slug мог смениться — старый ключ тоже сбрасываем
+    slugs.update(inspect(target).attrs.slug.history.deleted or ())
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    for slug in session.info.pop("lab_flag_slugs", ()):
+        invalidate_flag(slug)
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    session.info.pop("lab_flag_slugs", None)
@@ -0,0 +1,213 @@
+"""Фоновый запуск песочниц.
+
+run_lab только создаёт LabLaunch и ставит задачу в пул потоков процесса;
+HTTP-вызов в sandbox-manager идёт вне запроса. Состояние хранится в БД,
+поэтому опрашивать статус можно через любой воркер gunicorn.
+
+Для каждого slug из лабораторных уроков можно держать тёплый пул из
+LAB_WARM_POOL_SIZE заранее созданных сессий (WarmSandbox); по умолчанию 0 —
+пул выключен. Запуск сначала забирает готовую сессию из пула, пополнение
+идёт в отдельном пуле потоков (LAB_WARM_WORKERS) и не занимает потоки
+запусков.
+
+У sandbox-manager пока нет вызовов, чтобы привязать сессию к пользователю
+или закрыть её: тёплые сессии создаются с user_id=None и так и выдаются,
+а протухшие строки только удаляются из пула — сами сессии закрывает TTL
+менеджера. Поэтому пул и выключен по умолчанию.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from ..extensions import db
+from ..models.course import CourseLesson, LessonType, LabLaunch, WarmSandbox
+from . import sandbox_client
+from .settings import get_setting
+
+
+DEFAULT_WORKERS = 4
+DEFAULT_TIMEOUT = 120
+
+DEFAULT_WARM_POOL_SIZE = 0
+DEFAULT_WARM_TTL = 600
+DEFAULT_WARM_WORKERS = 1
+
+# имя пула -> (настройка числа потоков, значение по умолчанию)
+EXECUTORS = {
+    "lab-provision": ("LAB_PROVISION_WORKERS", DEFAULT_WORKERS),
+    "lab-warm": ("LAB_WARM_WORKERS", DEFAULT_WARM_WORKERS),
+}
+
+_executors = {}
+_executors_pid = None
+_executor_lock = threading.Lock()
+
+_refilling = set()
+_refilling_lock = threading.Lock()
+
+
+def _get_executor(name: str = "lab-provision") -> ThreadPoolExecutor:
+    global _executors, _executors_pid
+    pid = os.getpid()
+    with _executor_lock:
+        if _executors_pid != pid:
+            _executors, _executors_pid = {}, pid
+        if name not in _executors:
+            setting, default = EXECUTORS[name]
+            workers = int(get_setting(setting, default))
+            _executors[name] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+    return _executors[name]
+
+
+def _provision(app, launch_id: int) -> None:
+    with app.app_context():
+        try:
+            launch = db.session.get(LabLaunch, launch_id)
+            if launch is None or launch.status != LabLaunch.STARTING:
+                return
+            try:
+                data = sandbox_client.create_session(launch.lab_slug, launch.user_id)
+                launch.client_url = data["client_url"]
+                launch.status = LabLaunch.READY
+            except sandbox_client.SandboxUnavailable as e:
+                launch.status = LabLaunch.FAILED
+                launch.error = str(e)
+            except (sandbox_client.SandboxError, KeyError) as e:
+                app.logger.exception("sandbox create session failed")
+                launch.status = LabLaunch.FAILED
+                launch.error = str(e)[:500]
+            db.session.commit()
+        finally:
+            db.session.remove()
+
+
+def _warm_pool_size() -> int:
+    return int(get_setting("LAB_WARM_POOL_SIZE", DEFAULT_WARM_POOL_SIZE))
+
+
+def _warm_cutoff() -> datetime:
+    ttl = int(get_setting("LAB_WARM_TTL", DEFAULT_WARM_TTL))
+    return datetime.utcnow() - timedelta(seconds=ttl)
+
+
+def warm_targets() -> dict:
+    """slug -> сколько тёплых сессий держать: по всем лабам, встречающимся в уроках."""
+    size = _warm_pool_size()
+    if size <= 0:
+        return {}
+    slugs = db.session.query(CourseLesson.sandbox_slug).filter(
+        CourseLesson.lesson_type == LessonType.lab,
+        CourseLesson.sandbox_slug.isnot(None),
+        CourseLesson.sandbox_slug != "",
+    ).distinct().all()
+    return {slug: size for (slug,) in slugs}
+
+
+def claim_warm(lab_slug: str):
+    """Забрать свежую сессию из пула и вернуть её client_url (SKIP LOCKED — без ожидания соседей)."""
+    warm = WarmSandbox.query.filter(
+        WarmSandbox.lab_slug == lab_slug,
+        WarmSandbox.created_at >= _warm_cutoff(),
+    ).order_by(WarmSandbox.id).with_for_update(skip_locked=True).first()
+    if not warm:
+        return None
+    client_url = warm.client_url
+    db.session.delete(warm)
+    return client_url
+
+
+def expire_pool(lab_slug: str) -> int:
+    """Удалить протухшие строки пула slug. Возвращает число удалённых.
+
+    Сессии в sandbox-manager не закрываются — до них доберётся его TTL.
+    """
+    expired = WarmSandbox.query.filter(
+        WarmSandbox.lab_slug == lab_slug,
+        WarmSandbox.created_at < _warm_cutoff(),
+    ).with_for_update(skip_locked=True).all()
+    for warm in expired:
+        db.session.delete(warm)
+    db.session.commit()
+    return len(expired)
+
+
+def fill_pool(lab_slug: str, size: int) -> int:
+    """Досоздать тёплые сессии до size; протухшие удаляются. Возвращает число созданных."""
+    expire_pool(lab_slug)
+    available = WarmSandbox.query.filter_by(lab_slug=lab_slug).count()
+
+    created = 0
+    for _ in range(max(size - available, 0)):
+        try:
+            data = sandbox_client.create_session(lab_slug, None)
+            client_url = data["client_url"]
+        except (sandbox_client.SandboxError, KeyError):
+            current_app.logger.warning("warm pool refill for %s failed", lab_slug)
+            break
+        db.session.add(WarmSandbox(lab_slug=lab_slug, client_url=client_url))
+        db.session.commit()
+        created += 1
+    return created
+
+
+def _refill(app, lab_slug: str) -> None:
+    with app.app_context():
+        try:
+            size = warm_targets().get(lab_slug, 0)
+            if size:
+                fill_pool(lab_slug, size)
+        finally:
+            db.session.remove()
+            with _refilling_lock:
+                _refilling.discard(lab_slug)
+
+
+def schedule_refill(lab_slug: str) -> None:
+    """Пополнить пул slug в фоне; в процессе одновременно идёт не больше одной задачи на slug."""
+    if _warm_pool_size() <= 0:
+        return
+    with _refilling_lock:
+        if lab_slug in _refilling:
+            return
+        _refilling.add(lab_slug)
+    app = current_app._get_current_object()
+    _get_executor("lab-warm").submit(_refill, app, lab_slug)
+
+
+def start_launch(course_id: int, lesson_id: int, lab_slug: str, user_id) -> LabLaunch:
+    """Создать LabLaunch: из тёплого пула сразу READY, иначе — провижининг в очереди. Коммитит."""
+    launch = LabLaunch(
+        user_id=user_id,
+        course_id=course_id,
+        lesson_id=lesson_id,
+        lab_slug=lab_slug,
+        status=LabLaunch.STARTING,
+    )
+
+    warm_url = claim_warm(lab_slug) if _warm_pool_size() > 0 else None
+    if warm_url:
+        launch.client_url = warm_url
+        launch.status = LabLaunch.READY
+
+    db.session.add(launch)
+    db.session.commit()
+
+    if not warm_url:
+        app = current_app._get_current_object()
+        _get_executor().submit(_provision, app, launch.id)
+    schedule_refill(lab_slug)
+    return launch
+
+
+def expire_if_stuck(launch: LabLaunch) -> None:
+    """Задача могла умереть вместе с воркером — не держим студента на спиннере вечно."""
+    if launch.status != LabLaunch.STARTING:
+        return
+    timeout = int(get_setting("LAB_PROVISION_TIMEOUT", DEFAULT_TIMEOUT))
+    if launch.created_at < datetime.utcnow() - timedelta(seconds=timeout):
+        launch.status = LabLaunch.FAILED
+        launch.error = "Превышено время ожидания запуска"
+        db.session.commit()
@@ -0,0 +1,267 @@
+"""HTML лекций: обработка один раз при сохранении, а не на каждый просмотр.
+
+set_lesson_html() сохраняет исходник, как его ввёл преподаватель, в
+html_content, а результат render() — в rendered_html; lesson_detail
+выводит только rendered_html. render():
+
+- оставляет теги и атрибуты из белого списка, выкидывает <script>/<style>
+  вместе с содержимым, обработчики on*, javascript:-ссылки и комментарии;
+- <iframe> пропускает только с https-хостов LESSON_IFRAME_HOSTS;
+- закрывает незакрытые теги, чтобы сломанная разметка не ломала страницу;
+- внешним ссылкам ставит target=_blank и rel=noopener;
+- картинкам и iframe — loading=lazy, а картинки из uploads с готовыми
+  копиями (services/images.py) превращает в <picture> со srcset.
+
+При изменении обработки поднимите PIPELINE_VERSION и выполните
+flask lessons render: перерисуются уроки со старой версией.
+"""
+import re
+from html import escape
+from html.parser import HTMLParser
+from typing import Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from flask import current_app
+
+from ..extensions import db
+from ..models.course import CourseLesson, CourseModule
+from ..models.post import Post
+from . import images
+from .settings import get_setting
+
+
+PIPELINE_VERSION = 2
+
+ALLOWED_TAGS = {
+    "a", "abbr", "b", "blockquote", "br", "caption", "cite", "code", "col", "colgroup",
+    "dd", "del", "details", "div", "dl", "dt", "em", "figcaption", "figure",
+    "h1", "h2", "h3", "h4", "h5", "h6", "hr", "i", "iframe", "img", "ins", "kbd", "li",
+    "mark", "ol", "p", "pre", "q", "s", "samp", "small", "span", "strong", "sub",
+    "summary", "sup", "table", "tbody", "td", "tfoot", "th", "thead", "tr", "u", "ul",
+}
+# выбрасываются вместе с содержимым; пустые (embed) сюда нельзя — закрывающего
+# тега не будет, и пропустится весь остаток урока. Их отсекает ALLOWED_TAGS
+DROP_CONTENT = {"script", "style", "noscript", "template", "object", "svg", "math"}
+VOID_TAGS = {"br", "col", "hr", "img"}
+
+GLOBAL_ATTRS = {"class", "id", "title", "lang", "dir", "style"}
+TAG_ATTRS = {
+    "a": {"href", "name"},
+    "img": {"src", "alt", "width", "height"},
+    "iframe": {"src", "width", "height", "allow", "allowfullscreen", "frameborder"},
+    "td": {"colspan", "rowspan", "align"},
+    "th": {"colspan", "rowspan", "align", "scope"},
+    "col": {"span"},
+    "colgroup": {"span"},
+    "ol": {"start", "type", "reversed"},
+    "li": {"value"},
+    "q": {"cite"},
+    "blockquote": {"cite"},
+    "details": {"open"},
+}
+URL_ATTRS = {"href", "src", "cite"}
+SAFE_SCHEMES = {"", "http", "https", "mailto"}
+
+DEFAULT_IFRAME_HOSTS = (
+    "www.youtube.com", "youtube.com", "www.youtube-nocookie.com",
+    "player.vimeo.com", "rutube.ru",
+)
+CONTENT_SIZES = "(max-width: 900px) 100vw, 900px"
+
+_BAD_STYLE = re.compile(r"expression\s*\(|javascript:|url\s*\(|@import", re.I)
+
+
+def _iframe_hosts() -> set:
+    value = get_setting("LESSON_IFRAME_HOSTS", DEFAULT_IFRAME_HOSTS)
+    if isinstance(value, str):
+        value = [v for v in value.replace(" ", "").split(",") if v]
+    return set(value)
+
+
+def _safe_url(value: str) -> bool:
+    scheme = urlsplit(value.strip()).scheme.lower()
+    return scheme in SAFE_SCHEMES
+
+
+def _is_external(href: str) -> bool:
+    parts = urlsplit(href.strip())
+    return parts.scheme in ("http", "https") and bool(parts.netloc)
+
+
+class _Renderer(HTMLParser):
+    def __init__(self, iframe_hosts: set, static_prefix: str):
+        super().__init__(convert_charrefs=False)
+        self.iframe_hosts = iframe_hosts
+        self.static_prefix = static_prefix
+        self.out: List[str] = []
+        self.open: List[str] = []
+        self.skip = 0
+
+    # --- атрибуты ---------------------------------------------------------
+
+    def _attrs(self, tag: str, attrs) -> Optional[List[Tuple[str, Optional[str]]]]:
+        allowed = GLOBAL_ATTRS | TAG_ATTRS.get(tag, set())
+        clean = []
+        for name, value in attrs:
+            name = name.lower()
+            if name not in allowed:
+                continue
+            if name in URL_ATTRS and (value is None or not _safe_url(value)):
+                continue
+            if name == "style" and value and _BAD_STYLE.search(value):
+                continue
+            clean.append((name, value))
+
+        found = dict(clean)
+        if tag == "iframe":
+            src = urlsplit((found.get("src") or "").strip())
+            if src.scheme != "https" or src.hostname not in self.iframe_hosts:
+                return None
+            clean.append(("loading", "lazy"))
+        elif tag == "img":
+            if not found.get("src"):
+                return None
+            clean += [("loading", "lazy"), ("decoding", "async")]
+        elif tag == "a" and found.get("href") and _is_external(found["href"]):
+            clean += [("target", "_blank"), ("rel", "noopener noreferrer")]
+        return clean
+
+    @staticmethod
+    def _tag(tag: str, attrs) -> str:
+        parts = [tag]
+        for name, value in attrs:
+            parts.append(name if value is None else f'{name}="{escape(value, quote=True)}"')
+        return "<" + " ".join(parts) + ">"
+
+    def _picture(self, attrs) -> Optional[str]:
+        """<img> из uploads с готовыми копиями -> <picture> со srcset."""
+        found = dict(attrs)
+        src = found["src"].strip()
+        prefix = self.static_prefix + "/"
+        if not src.startswith(prefix + "uploads/"):
+            return None
+        info = images.image_info(src[len(prefix):])
+        if info is None:
+            return None
+
+        def srcset(variants):
+            return ", ".join(f"{prefix}{v.path} {v.width}w" for v in variants)
+
+        img_attrs = [(k, v) for k, v in attrs if k not in ("src", "width", "height")]
+        img_attrs = [
+            ("src", prefix + info.src),
+            ("srcset", srcset(info.sources(info.fallback_type))),
+            ("sizes", CONTENT_SIZES),
+            ("width", str(info.width)),
+            ("height", str(info.height)),
+        ] + img_attrs
+        webp = self._tag("source", [
+            ("type", "image/webp"), ("srcset", srcset(info.sources("image/webp"))), ("sizes", CONTENT_SIZES),
+        ])
+        return f"<picture>{webp}{self._tag('img', img_attrs)}</picture>"
+
+    # --- HTMLParser -------------------------------------------------------
+
+    def handle_starttag(self, tag, attrs):
+        if self.skip:
+            if tag in DROP_CONTENT:
+                self.skip += 1
+            return
+        if tag in DROP_CONTENT:
+            self.skip = 1
+            return
+        if tag not in ALLOWED_TAGS:
+            return
+        clean = self._attrs(tag, attrs)
+        if clean is None:
+            return
+        if tag == "img":
+            self.out.append(self._picture(clean) or self._tag(tag, clean))
+            return
+        self.out.append(self._tag(tag, clean))
+        if tag not in VOID_TAGS:
+            self.open.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        # <svg/> без содержимого: пропускать нечего
+        if tag in DROP_CONTENT:
+            return
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS and self.open and self.open[-1] == tag:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if self.skip:
+            if tag in DROP_CONTENT:
+                self.skip -= 1
+            return
+        if tag not in self.open:
+            return
+        while self.open:
+            current = self.open.pop()
+            self.out.append(f"</{current}>")
+            if current == tag:
+                break
+
+    def handle_data(self, data):
+        if not self.skip:
+            self.out.append(escape(data, quote=False))
+
+    def handle_entityref(self, name):
+        if not self.skip:
+            self.out.append(f"&{name};")
+
+    def handle_charref(self, name):
+        if not self.skip:
+            self.out.append(f"&#{name};")
+
+    def render(self, source: str) -> str:
+        self.feed(source)
+        self.close()
+        while self.open:
+            self.out.append(f"</{self.open.pop()}>")
+        return "".join(self.out)
+
+
+def render(source: Optional[str]) -> str:
+    """Очищенный и обработанный HTML урока (нужен контекст приложения)."""
+    if not source:
+        return ""
+    return _Renderer(_iframe_hosts(), current_app.static_url_path).render(source)
+
+
+def set_lesson_html(lesson: CourseLesson, source: Optional[str]) -> None:
+    lesson.html_content = source
+    lesson.rendered_html = render(source)
+    lesson.render_version = PIPELINE_VERSION
+
+
+def rerender(everything: bool = False, batch: int = 200) -> Iterator[Tuple[int, int]]:
+    """Перерисовать уроки со старой PIPELINE_VERSION (или все), пачками по batch.
+
+    Курсам с изменёнными уроками поднимается версия — страницы уроков
+    получают новые ETag. Выдаёт (id курса, число уроков).
+    """
+    query = db.session.query(CourseLesson.id).filter(CourseLesson.html_content.isnot(None))
+    if not everything:
+        query = query.filter(db.or_(
+            CourseLesson.render_version.is_(None),
+            CourseLesson.render_version != PIPELINE_VERSION,
+        ))
+    ids = [lesson_id for (lesson_id,) in query.order_by(CourseLesson.id)]
+
+    touched = {}
+    for start in range(0, len(ids), batch):
+        chunk = ids[start:start + batch]
+        rows = db.session.query(CourseLesson, CourseModule.course_id).join(
+            CourseModule, CourseModule.id == CourseLesson.module_id,
+        ).filter(CourseLesson.id.in_(chunk))
+        for lesson, course_id in rows:
+            set_lesson_html(lesson, lesson.html_content)
+            touched[course_id] = touched.get(course_id, 0) + 1
+        db.session.commit()
+
+    for course in Post.query.filter(Post.id.in_(touched)) if touched else ():
+        course.bump_version()
+    db.session.commit()
+    yield from sorted(touched.items())
@@ -0,0 +1,72 @@
+"""Оглавление курса (модули и уроки) для course_detail.
+
+Грузится двумя запросами и только лёгкими колонками (без html_content),
+кешируется в процессе по ключу (course_id, content_version). Версию курса
+поднимают course_admin и edit_lesson, поэтому устаревшая запись просто
+перестаёт запрашиваться — в том числе в соседних воркерах gunicorn.
+"""
+from dataclasses import dataclass, field
+from typing import List
+
+from ..extensions import db
+from ..models.course import CourseModule, CourseLesson
+from .cache import VersionedCache
+
+
+OUTLINE_CACHE_SIZE = 256
+
+
+@dataclass(frozen=True)
+class OutlineLesson:
+    id: int
+    title: str
+    order: int
+    lesson_type: str
+
+
+@dataclass(frozen=True)
+class OutlineModule:
+    id: int
+    title: str
+    description: str
+    order: int
+    lessons: List[OutlineLesson] = field(default_factory=list)
+
+
+_cache = VersionedCache(OUTLINE_CACHE_SIZE)
+
+
+def load_outline(course_id: int) -> List[OutlineModule]:
+    """Модули курса с уроками — ровно два запроса независимо от числа модулей."""
+    modules = db.session.query(
+        CourseModule.id, CourseModule.title, CourseModule.description, CourseModule.order
+    ).filter(
+        CourseModule.course_id == course_id
+    ).order_by(CourseModule.order, CourseModule.id).all()
+
+    lessons = db.session.query(
+        CourseLesson.id, CourseLesson.module_id, CourseLesson.title,
+        CourseLesson.order, CourseLesson.lesson_type,
+    ).join(CourseModule).filter(
+        CourseModule.course_id == course_id
+    ).order_by(CourseLesson.order, CourseLesson.id).all()
+
+    by_module = {m.id: [] for m in modules}
+    for l in lessons:
+        by_module[l.module_id].append(OutlineLesson(l.id, l.title, l.order, l.lesson_type))
+
+    return [
+        OutlineModule(m.id, m.title, m.description, m.order, by_module[m.id])
+        for m in modules
+    ]
+
+
+def get_outline(course) -> List[OutlineModule]:
+    """Оглавление из кеша процесса; при промахе — load_outline."""
+    key = (course.id, course.content_version or 0)
+    return _cache.get_or_load(key, lambda: load_outline(course.id))
+
+
+def invalidate_outline(course_id: int) -> None:
+    """Сбросить локальные записи курса (другие воркеры отсеются по версии)."""
+    _cache.discard(lambda key: key[0] == course_id)
@@ -0,0 +1,147 @@
+"""Keyset-пагинация: страница = «следующие N строк после курсора».
+
+В отличие от OFFSET, цена страницы не растёт с её номером: фильтр по
+курсору и ORDER BY идут по индексу. Курсор — значения ключей сортировки
+последней строки страницы, упакованные в непрозрачную строку для URL.
+"""
+import base64
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional, Sequence, Tuple
+
+from flask import request, url_for
+from sqlalchemy import and_, or_
+
+from .settings import get_setting
+
+
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 200
+
+
+@dataclass
+class Page:
+    items: list
+    per_page: int
+    sort: str
+    cursor: Optional[str]
+    next_cursor: Optional[str]
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    @property
+    def is_first(self) -> bool:
+        return self.cursor is None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def _encode(values: Sequence) -> str:
+    packed = [{"dt": v.isoformat()} if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(packed, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _matches(value, column) -> bool:
+    """Значение из курсора подходит по типу к столбцу сортировки."""
+    try:
+        expected = column.type.python_type
+    except NotImplementedError:
+        return isinstance(value, (str, int, float, datetime)) and not isinstance(value, bool)
+    if isinstance(value, bool) and expected is not bool:
+        return False
+    if expected is float:
+        return isinstance(value, (int, float))
+    return isinstance(value, expected)
+
+
+def _decode(cursor: Optional[str], order: List[Tuple]) -> Optional[list]:
+    """Значения ключей из курсора или None, если курсор битый или не от этой сортировки."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        packed = json.loads(raw)
+        if not isinstance(packed, list) or len(packed) != len(order):
+            return None
+        values = [datetime.fromisoformat(v["dt"]) if isinstance(v, dict) else v for v in packed]
+    except (ValueError, TypeError, KeyError):
+        return None
+    if not all(_matches(v, column) for v, (column, _) in zip(values, order)):
+        return None
+    return values
+
+
+def per_page_arg(default: Optional[int] = None) -> int:
+    """?per_page=, зажатый в [1, PAGINATION_MAX_PER_PAGE]."""
+    default = default or int(get_setting("PAGINATION_PER_PAGE", DEFAULT_PER_PAGE))
+    limit = int(get_setting("PAGINATION_MAX_PER_PAGE", MAX_PER_PAGE))
+    try:
+        value = int(request.args.get("per_page", default))
+    except (TypeError, ValueError):
+        value = default
+    return max(1, min(value, limit))
+
+
+def sort_arg(choices: Sequence[str], param: str = "sort") -> str:
+    """?sort= из списка допустимых; по умолчанию — первый."""
+    value = request.args.get(param)
+    return value if value in choices else choices[0]
+
+
+def _after(order: List[Tuple], values: list):
+    """Строки строго после курсора при сортировке order: (a > x) OR (a = x AND b > y) ..."""
+    clauses = []
+    for i, (column, descending) in enumerate(order):
+        step = column < values[i] if descending else column > values[i]
+        clauses.append(and_(*[order[j][0] == values[j] for j in range(i)], step))
+    return or_(*clauses)
+
+
+def paginate(query, order: List[Tuple], *, sort: str, cursor: Optional[str], per_page: int,
+             key=None) -> Page:
+    """Страница query после cursor.
+
+    order — [(столбец, по_убыванию)], последний столбец должен быть
+    уникальным (id), иначе строки с равными ключами потеряются между
+    страницами. Столбцы не должны содержать NULL. key(row) возвращает
+    значения ключей строки; по умолчанию берутся одноимённые атрибуты.
+    """
+    values = _decode(cursor, order)
+    if values is not None:
+        query = query.filter(_after(order, values))
+    else:
+        cursor = None
+
+    query = query.order_by(*[column.desc() if descending else column.asc() for column, descending in order])
+    rows = query.limit(per_page + 1).all()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1]
+        keys = key(last) if key else [getattr(last, column.key) for column, _ in order]
+        next_cursor = _encode(keys)
+
+    return Page(items=rows, per_page=per_page, sort=sort, cursor=cursor, next_cursor=next_cursor)
+
+
+def page_url(**changes) -> str:
+    """URL текущей страницы с изменёнными параметрами (None — убрать параметр).
+
+    При смене сортировки сбрасываются все курсоры (*after): старые значения
+    ключей к новой сортировке не подходят.
+    """
+    args = request.args.to_dict()
+    if "sort" in changes:
+        args = {k: v for k, v in args.items() if not k.endswith("after")}
+    args.update(changes)
+    args = {k: v for k, v in args.items() if v is not None}
+    return url_for(request.endpoint, **(request.view_args or {}), **args)
@@ -0,0 +1,146 @@
+"""Хеширование паролей bcrypt в ограниченном пуле потоков.
+
+bcrypt отпускает GIL, поэтому хеш считается в отдельном потоке, а
+число одновременных хеширований в процессе ограничено
+PASSWORD_HASH_WORKERS. Если в очереди уже PASSWORD_HASH_QUEUE задач,
+новая сразу получает HashingBusy — во время волны логинов процесс
+продолжает отдавать лекции, а не копит очередь.
+
+Стоимость задаёт BCRYPT_LOG_ROUNDS; хеши с другой стоимостью
+перевыпускаются при успешном входе (см. needs_rehash).
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from flask import current_app
+
+from ..extensions import bcrypt
+from .settings import get_setting
+
+
+DEFAULT_ROUNDS = 12
+DEFAULT_WORKERS = 2
+DEFAULT_QUEUE = 16
+DEFAULT_WAIT = 10
+
+
+class HashingBusy(Exception):
+    """Очередь хеширования переполнена или задача не дождалась своей очереди."""
+
+
+class _Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                "queue_depth": self.pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_ms": round(self.total_ms / self.completed, 1) if self.completed else 0.0,
+                "max_ms": round(self.max_ms, 1),
+            }
+
+
+stats = _Stats()
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor, _executor_pid
+    pid = os.getpid()
+    with _executor_lock:
+        if _executor is None or _executor_pid != pid:
+            workers = int(get_setting("PASSWORD_HASH_WORKERS", DEFAULT_WORKERS))
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+            _executor_pid = pid
+    return _executor
+
+
+def rounds() -> int:
+    return int(get_setting("BCRYPT_LOG_ROUNDS", DEFAULT_ROUNDS))
+
+
+def _run(op: str, fn, *args):
+    limit = int(get_setting("PASSWORD_HASH_QUEUE", DEFAULT_QUEUE))
+    with stats.lock:
+        if stats.pending >= limit:
+            stats.rejected += 1
+            depth = stats.pending
+            busy = True
+        else:
+            stats.pending += 1
+            depth = stats.pending
+            busy = False
+    if busy:
+        current_app.logger.warning("password %s rejected, queue depth %d", op, depth)
+        raise HashingBusy()
+
+    queued = time.perf_counter()
+    timing = {}
+
+    def task():
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            timing["hash_ms"] = (time.perf_counter() - started) * 1000
+            timing["wait_ms"] = (started - queued) * 1000
+
+    def done(_future):
+        # задачу, которую уже начал поток, cancel() не остановит: место в
+        # очереди освобождается, только когда хеш действительно досчитан
+        with stats.lock:
+            stats.pending -= 1
+            if "hash_ms" in timing:
+                stats.completed += 1
+                stats.total_ms += timing["hash_ms"]
+                stats.max_ms = max(stats.max_ms, timing["hash_ms"])
+
+    try:
+        future = _get_executor().submit(task)
+    except RuntimeError:
+        done(None)
+        raise
+    future.add_done_callback(done)
+    try:
+        result = future.result(timeout=float(get_setting("PASSWORD_HASH_WAIT", DEFAULT_WAIT)))
+    except FutureTimeout:
+        future.cancel()
+        raise HashingBusy()
+
+    current_app.logger.info(
+        "password %s in %.1f ms (waited %.1f ms, queue depth %d)",
+        op, timing["hash_ms"], timing["wait_ms"], depth,
+    )
+    return result
+
+
+def hash_password(raw_password: str) -> str:
+    cost = rounds()
+    return _run("hash", lambda: bcrypt.generate_password_hash(raw_password, cost).decode("utf-8"))
+
+
+def verify_password(pw_hash: str, raw_password: str) -> bool:
+    if not pw_hash:
+        return False
+    return _run("verify", bcrypt.check_password_hash, pw_hash, raw_password)
+
+
+def needs_rehash(pw_hash: str) -> bool:
+    """Хеш посчитан с другой стоимостью, чем BCRYPT_LOG_ROUNDS ($2b$<cost>$...)."""
+    try:
+        return int(pw_hash.split("$")[2]) != rounds()
+    except (AttributeError, IndexError, ValueError):
+        return True
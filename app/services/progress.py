@@ -0,0 +1,285 @@
+"""Денормализованный прогресс студентов: LessonResult по урокам и CourseProgress по курсу.
+
+Функции record_* вызываются из маршрутов до commit и меняют строки в той же
+транзакции, что и сама попытка. Чтение ведомости — это выборка CourseProgress,
+без обращения к сырым попыткам.
+"""
+from collections import defaultdict
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import case, func
+from sqlalchemy.exc import IntegrityError
+
+from ..extensions import db
+from ..models.course import (
+    TestAttempt, LabAttempt, StudentProgress,
+    LessonResult, CourseProgress, LabLaunch,
+)
+from ..models.post import Post
+from .gradebook import course_lessons, compute_course_gradebook, summarize_stats
+
+
+def _seed(row: LessonResult) -> None:
+    """Начальные значения новой строки из сырых попыток, сделанных до неё.
+
+    Строки может не быть при уже накопленной истории (не запускали rebuild,
+    урок удаляли из сводки) — без этого счётчики начались бы с нуля.
+    """
+    done = db.session.query(StudentProgress.id).filter_by(
+        student_id=row.student_id, lesson_id=row.lesson_id, completed=True,
+    ).first()
+    row.completed = done is not None
+
+    tests = db.session.query(TestAttempt.score, TestAttempt.total, func.count(TestAttempt.id)).filter_by(
+        student_id=row.student_id, lesson_id=row.lesson_id,
+    ).group_by(TestAttempt.score, TestAttempt.total).all()
+    for score, total, n in tests:
+        ratio = score / total if total else 0.0
+        row.attempts += n
+        if row.best_ratio is None or ratio > row.best_ratio:
+            row.best_ratio = ratio
+
+    n, solved, wrong = db.session.query(
+        func.count(LabAttempt.id),
+        func.max(case((LabAttempt.is_correct.is_(True), 1), else_=0)),
+        func.sum(case((LabAttempt.is_correct.is_(False), 1), else_=0)),
+    ).filter_by(student_id=row.student_id, lesson_id=row.lesson_id).one()
+    row.attempts += n
+    row.solved = bool(solved)
+    row.wrong_attempts = int(wrong or 0)
+
+
+def _lesson_result(student_id: int, course_id: int, lesson_id: int) -> LessonResult:
+    query = LessonResult.query.filter_by(student_id=student_id, lesson_id=lesson_id).with_for_update()
+    # текущая попытка уже в сессии, но ещё не в базе: без autoflush
+    # _seed её не увидит, и вызывающий учтёт её сам
+    with db.session.no_autoflush:
+        row = query.first()
+        if row:
+            return row
+
+        row = LessonResult(
+            student_id=student_id,
+            course_id=course_id,
+            lesson_id=lesson_id,
+            completed=False,
+            attempts=0,
+            solved=False,
+            wrong_attempts=0,
+        )
+        _seed(row)
+
+    # FOR UPDATE не блокирует несуществующую строку: две первые попытки
+    # одновременно дойдут до INSERT, и вторая упрётся в уникальный индекс.
+    # Вставляем в точке сохранения и при конфликте берём строку соседа
+    try:
+        with db.session.begin_nested():
+            db.session.add(row)
+    except IntegrityError:
+        row = query.one()
+    return row
+
+
+def _stats_from_results(lessons: tuple, results: Iterable[LessonResult]) -> dict:
+    lecture_ids, test_ids, lab_ids = lessons
+    lecture_set, lab_set = set(lecture_ids), set(lab_ids)
+
+    lectures_done = 0
+    best_ratios = {}
+    labs_solved = 0
+    lab_attempts_total = 0
+    for r in results:
+        if r.lesson_id in lecture_set and r.completed:
+            lectures_done += 1
+        elif r.lesson_id in lab_set:
+            lab_attempts_total += r.attempts
+            if r.solved:
+                labs_solved += 1
+        elif r.best_ratio is not None:
+            best_ratios[r.lesson_id] = r.best_ratio
+
+    return summarize_stats(
+        lecture_ids, test_ids, lab_ids,
+        lectures_done=lectures_done,
+        best_ratios=best_ratios,
+        labs_solved=labs_solved,
+        lab_attempts_total=lab_attempts_total,
+    )
+
+
+def _store(progress: Optional[CourseProgress], student_id: int, course_id: int, stats: dict) -> CourseProgress:
+    if not progress:
+        progress = CourseProgress(student_id=student_id, course_id=course_id)
+        db.session.add(progress)
+    for field in CourseProgress.STAT_FIELDS:
+        setattr(progress, field, stats[field])
+    return progress
+
+
+def refresh_student_progress(student_id: int, course_id: int, lessons: Optional[tuple] = None) -> CourseProgress:
+    """Пересчитать CourseProgress одного студента из его LessonResult (O(уроков курса))."""
+    lessons = lessons if lessons is not None else course_lessons(course_id)
+    results = LessonResult.query.filter_by(student_id=student_id, course_id=course_id).all()
+    progress = CourseProgress.query.filter_by(student_id=student_id, course_id=course_id).first()
+    return _store(progress, student_id, course_id, _stats_from_results(lessons, results))
+
+
+def refresh_course_progress(course_id: int) -> None:
+    """Пересчитать CourseProgress всех студентов курса — после изменения структуры курса."""
+    lessons = course_lessons(course_id)
+
+    results = defaultdict(list)
+    for r in LessonResult.query.filter_by(course_id=course_id).all():
+        results[r.student_id].append(r)
+
+    existing = {p.student_id: p for p in CourseProgress.query.filter_by(course_id=course_id).all()}
+
+    for student_id in set(results) | set(existing):
+        stats = _stats_from_results(lessons, results.get(student_id, []))
+        _store(existing.get(student_id), student_id, course_id, stats)
+
+
+def forget_lessons(lesson_ids: Iterable[int]) -> None:
+    """Удалить сводные результаты и запуски лаб по урокам, которые сейчас будут удалены."""
+    lesson_ids = list(lesson_ids)
+    if lesson_ids:
+        LessonResult.query.filter(LessonResult.lesson_id.in_(lesson_ids)).delete(synchronize_session=False)
+        LabLaunch.query.filter(LabLaunch.lesson_id.in_(lesson_ids)).delete(synchronize_session=False)
+
+
+def record_lecture_completed(student_id: int, course_id: int, lesson_id: int) -> None:
+    row = _lesson_result(student_id, course_id, lesson_id)
+    row.completed = True
+    refresh_student_progress(student_id, course_id)
+
+
+def record_test_attempt(student_id: int, course_id: int, lesson_id: int, score: int, total: int) -> None:
+    row = _lesson_result(student_id, course_id, lesson_id)
+    ratio = score / total if total else 0.0
+    row.attempts += 1
+    if row.best_ratio is None or ratio > row.best_ratio:
+        row.best_ratio = ratio
+    refresh_student_progress(student_id, course_id)
+
+
+def record_lab_attempt(student_id: int, course_id: int, lesson_id: int, is_correct: bool) -> LessonResult:
+    row = _lesson_result(student_id, course_id, lesson_id)
+    row.attempts += 1
+    if is_correct:
+        row.solved = True
+    else:
+        row.wrong_attempts += 1
+    refresh_student_progress(student_id, course_id)
+    return row
+
+
+def course_progress_stats(course_id: int, student_ids: Iterable[int]) -> Dict[int, dict]:
+    """student_id -> статистика из CourseProgress.
+
+    Студентов без строки (ещё не было активности или не запускали rebuild)
+    досчитываем сгруппированными запросами из сырых попыток.
+    """
+    student_ids = list(student_ids)
+    if not student_ids:
+        return {}
+
+    rows = CourseProgress.query.filter(
+        CourseProgress.course_id == course_id,
+        CourseProgress.student_id.in_(student_ids),
+    ).all()
+    stats = {p.student_id: p.as_stats() for p in rows}
+
+    missing = [sid for sid in student_ids if sid not in stats]
+    if missing:
+        stats.update(compute_course_gradebook(course_id, missing))
+    return stats
+
+
+def rebuild_course(course_id: int) -> int:
+    """Заново построить LessonResult/CourseProgress курса из сырых попыток.
+
+    Возвращает число студентов с пересчитанным прогрессом. Не коммитит.
+    """
+    LessonResult.query.filter_by(course_id=course_id).delete(synchronize_session=False)
+    CourseProgress.query.filter_by(course_id=course_id).delete(synchronize_session=False)
+
+    lecture_ids, test_ids, lab_ids = course_lessons(course_id)
+    results = {}
+
+    def row(student_id, lesson_id):
+        key = (student_id, lesson_id)
+        if key not in results:
+            results[key] = LessonResult(
+                student_id=student_id,
+                course_id=course_id,
+                lesson_id=lesson_id,
+                completed=False,
+                attempts=0,
+                solved=False,
+                wrong_attempts=0,
+            )
+        return results[key]
+
+    if lecture_ids:
+        done = db.session.query(StudentProgress.student_id, StudentProgress.lesson_id).filter(
+            StudentProgress.course_id == course_id,
+            StudentProgress.completed.is_(True),
+            StudentProgress.lesson_id.in_(lecture_ids),
+        ).distinct().all()
+        for student_id, lesson_id in done:
+            row(student_id, lesson_id).completed = True
+
+    if test_ids:
+        attempts = db.session.query(
+            TestAttempt.student_id, TestAttempt.lesson_id,
+            TestAttempt.score, TestAttempt.total, func.count(TestAttempt.id),
+        ).filter(
+            TestAttempt.lesson_id.in_(test_ids),
+        ).group_by(
+            TestAttempt.student_id, TestAttempt.lesson_id, TestAttempt.score, TestAttempt.total
+        ).all()
+        for student_id, lesson_id, score, total, n in attempts:
+            r = row(student_id, lesson_id)
+            ratio = score / total if total else 0.0
+            r.attempts += n
+            if r.best_ratio is None or ratio > r.best_ratio:
+                r.best_ratio = ratio
+
+    if lab_ids:
+        attempts = db.session.query(
+            LabAttempt.student_id, LabAttempt.lesson_id,
+            func.count(LabAttempt.id),
+            func.max(case((LabAttempt.is_correct.is_(True), 1), else_=0)),
+            func.sum(case((LabAttempt.is_correct.is_(False), 1), else_=0)),
+        ).filter(
+            LabAttempt.lesson_id.in_(lab_ids),
+        ).group_by(LabAttempt.student_id, LabAttempt.lesson_id).all()
+        for student_id, lesson_id, n, solved, wrong in attempts:
+            r = row(student_id, lesson_id)
+            r.attempts += n
+            r.solved = bool(solved)
+            r.wrong_attempts = int(wrong or 0)
+
+    db.session.add_all(results.values())
+    db.session.flush()
+
+    lessons = (lecture_ids, test_ids, lab_ids)
+    per_student = defaultdict(list)
+    for r in results.values():
+        per_student[r.student_id].append(r)
+    for student_id, student_results in per_student.items():
+        _store(None, student_id, course_id, _stats_from_results(lessons, student_results))
+    return len(per_student)
+
+
+def rebuild_all(course_id: Optional[int] = None):
+    """Пересобрать прогресс по одному или всем курсам; коммит после каждого курса."""
+    if course_id is not None:
+        course_ids = [course_id]
+    else:
+        course_ids = [cid for (cid,) in db.session.query(Post.id).order_by(Post.id).all()]
+
+    for cid in course_ids:
+        students = rebuild_course(cid)
+        db.session.commit()
+        yield cid, students
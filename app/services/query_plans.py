@@ -0,0 +1,116 @@
+"""EXPLAIN ключевых запросов маршрутов: проверка, что ни один не читает таблицу целиком.
+
+На Postgres план строится с SET LOCAL enable_seqscan = off: на маленькой
+базе планировщик честно выбирает Seq Scan, а с запретом он уйдёт на него
+только если подходящего индекса нет вовсе. На SQLite смотрим
+EXPLAIN QUERY PLAN: «SCAN <таблица>» без индекса — полный проход.
+"""
+import json
+from typing import List, NamedTuple
+
+from sqlalchemy import func, select, text
+
+from ..extensions import db
+from ..models.course import (
+    CourseModule, CourseLesson, LessonType,
+    TestAttempt, LabAttempt, StudentProgress,
+)
+from ..models.post import Post, user_course
+
+
+class PlanResult(NamedTuple):
+    name: str
+    plan: List[str]
+    seq_scans: List[str]
+
+
+def _sample_ids() -> dict:
+    def first(column, *where):
+        return db.session.execute(select(func.min(column)).where(*where)).scalar() or 1
+
+    return {
+        "course": first(Post.id),
+        "module": first(CourseModule.id),
+        "student": first(user_course.c.user_id),
+        "test": first(CourseLesson.id, CourseLesson.lesson_type == LessonType.test.value),
+        "lab": first(CourseLesson.id, CourseLesson.lesson_type == LessonType.lab.value),
+        "lecture": first(CourseLesson.id, CourseLesson.lesson_type == LessonType.lecture.value),
+    }
+
+
+def key_queries() -> list:
+    """(имя, select) — те же фильтры, что у маршрутов и сервисов ведомости."""
+    ids = _sample_ids()
+    return [
+        ("outline: modules of course",
+         select(CourseModule.id).where(CourseModule.course_id == ids["course"])
+         .order_by(CourseModule.order, CourseModule.id)),
+        ("outline: lessons of course",
+         select(CourseLesson.id).join(CourseModule).where(CourseModule.course_id == ids["course"])
+         .order_by(CourseLesson.order, CourseLesson.id)),
+        ("add_*: lessons of module",
+         select(CourseLesson.id).where(CourseLesson.module_id == ids["module"]).order_by(CourseLesson.order)),
+        ("lesson_detail: test attempts",
+         select(TestAttempt.id).where(TestAttempt.student_id == ids["student"],
+                                      TestAttempt.lesson_id == ids["test"])
+         .order_by(TestAttempt.created_at.desc())),
+        ("gradebook: test attempts",
+         select(TestAttempt.student_id, func.count(TestAttempt.id))
+         .where(TestAttempt.lesson_id.in_([ids["test"]]), TestAttempt.student_id.in_([ids["student"]]))
+         .group_by(TestAttempt.student_id)),
+        ("submit_flag: wrong lab attempts",
+         select(func.count(LabAttempt.id)).where(LabAttempt.student_id == ids["student"],
+                                                 LabAttempt.lesson_id == ids["lab"],
+                                                 LabAttempt.is_correct.is_(False))),
+        ("gradebook: lab attempts",
+         select(LabAttempt.student_id, func.count(LabAttempt.id))
+         .where(LabAttempt.lesson_id.in_([ids["lab"]]), LabAttempt.student_id.in_([ids["student"]]))
+         .group_by(LabAttempt.student_id)),
+        ("mark_completed: student progress",
+         select(StudentProgress.id).where(StudentProgress.student_id == ids["student"],
+                                          StudentProgress.course_id == ids["course"],
+                                          StudentProgress.lesson_id == ids["lecture"])),
+        ("course_students: enrolled students",
+         select(user_course.c.user_id).where(user_course.c.course_id == ids["course"])),
+    ]
+
+
+def _sql(stmt) -> str:
+    return str(stmt.compile(dialect=db.engine.dialect, compile_kwargs={"literal_binds": True}))
+
+
+def _walk_pg(node, plan, scans, depth=0):
+    label = node["Node Type"]
+    if "Relation Name" in node:
+        label += f" on {node['Relation Name']}"
+    if "Index Name" in node:
+        label += f" using {node['Index Name']}"
+    plan.append("  " * depth + label)
+    if node["Node Type"] == "Seq Scan":
+        scans.append(node.get("Relation Name", "?"))
+    for child in node.get("Plans", ()):
+        _walk_pg(child, plan, scans, depth + 1)
+
+
+def explain(name: str, stmt) -> PlanResult:
+    sql = _sql(stmt)
+    plan, scans = [], []
+    if db.engine.dialect.name == "postgresql":
+        with db.engine.connect() as conn:
+            with conn.begin():
+                conn.execute(text("SET LOCAL enable_seqscan = off"))
+                raw = conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+        doc = raw if isinstance(raw, list) else json.loads(raw)
+        _walk_pg(doc[0]["Plan"], plan, scans)
+    else:
+        with db.engine.connect() as conn:
+            for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")):
+                detail = row[-1]
+                plan.append(detail)
+                if detail.startswith("SCAN ") and " INDEX " not in detail and "CONSTANT ROW" not in detail:
+                    scans.append(detail.split()[1])
+    return PlanResult(name=name, plan=plan, seq_scans=scans)
+
+
+def check_plans() -> List[PlanResult]:
+    return [explain(name, stmt) for name, stmt in key_queries()]
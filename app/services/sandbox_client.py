@@ -0,0 +1,229 @@
+"""HTTP-клиент sandbox-manager.
+
+Один requests.Session (пул keep-alive соединений) на процесс воркера,
+раздельные таймауты на соединение и чтение, ограниченные повторы только
+для идемпотентных вызовов и лог задержки каждого запроса.
+
+Все вызовы идут через автомат-предохранитель (circuit breaker): после
+SANDBOX_BREAKER_THRESHOLD подряд неудач он размыкается и следующие
+SANDBOX_BREAKER_RESET секунд запросы отклоняются сразу, без сети. Затем
+пропускается один пробный запрос (half-open).
+
+requests импортируется вместе с приложением: при preload_app это
+происходит в мастере gunicorn до gc.freeze(), и модуль делится между
+воркерами copy-on-write, а не загружается в каждом после fork.
+"""
+import os
+import threading
+import time
+
+import requests
+from flask import current_app
+from requests.adapters import HTTPAdapter
+
+from .settings import get_setting
+
+
+DEFAULT_CONNECT_TIMEOUT = 2.0
+DEFAULT_READ_TIMEOUT = 8.0
+DEFAULT_RETRIES = 2
+DEFAULT_POOL_SIZE = 10
+
+RETRY_STATUSES = {502, 503, 504}
+
+
+DEFAULT_BREAKER_THRESHOLD = 5
+DEFAULT_BREAKER_RESET = 30
+
+
+class SandboxError(Exception):
+    """Запрос в sandbox-manager не удался (сеть, таймаут или ответ не 2xx)."""
+
+
+class SandboxUnavailable(SandboxError):
+    """Предохранитель разомкнут — sandbox-manager считаем лежащим, в сеть не ходим."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Лабораторные временно недоступны")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opened_total = 0
+        self.rejected_total = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _threshold() -> int:
+        return int(get_setting("SANDBOX_BREAKER_THRESHOLD", DEFAULT_BREAKER_THRESHOLD))
+
+    @staticmethod
+    def _reset_timeout() -> float:
+        return float(get_setting("SANDBOX_BREAKER_RESET", DEFAULT_BREAKER_RESET))
+
+    def _set_state(self, state: str) -> None:
+        if state != self.state:
+            current_app.logger.warning("sandbox breaker %s -> %s (failures=%d)", self.state, state, self.failures)
+            self.state = state
+
+    def retry_after(self) -> int:
+        remaining = self.opened_at + self._reset_timeout() - time.monotonic()
+        return max(int(remaining) + 1, 1)
+
+    def before_call(self) -> None:
+        """Пропустить вызов или сразу бросить SandboxUnavailable."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self._reset_timeout():
+                self._set_state(self.HALF_OPEN)
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            self.rejected_total += 1
+            raise SandboxUnavailable(self.retry_after())
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self._probe_in_flight = False
+            self._set_state(self.CLOSED)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self._threshold():
+                self.opened_at = time.monotonic()
+                if self.state != self.OPEN:
+                    self.opened_total += 1
+                self._set_state(self.OPEN)
+
+    def is_open(self) -> bool:
+        """Разомкнут и пробовать ещё рано — для быстрых проверок в маршрутах."""
+        with self._lock:
+            return self.state == self.OPEN and time.monotonic() - self.opened_at < self._reset_timeout()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "opened_total": self.opened_total,
+                "rejected_total": self.rejected_total,
+            }
+
+
+breaker = CircuitBreaker()
+
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+
+def get_session():
+    """requests.Session текущего процесса. После fork (preload в gunicorn) создаётся
+    заново, чтобы воркеры не делили сокеты мастера."""
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is not None and _session_pid == pid:
+        return _session
+
+    with _session_lock:
+        if _session is None or _session_pid != pid:
+            pool_size = int(get_setting("SANDBOX_POOL_SIZE", DEFAULT_POOL_SIZE))
+            session = requests.Session()
+            # повторы делаем сами и только для идемпотентных вызовов
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session, _session_pid = session, pid
+    return _session
+
+
+def _timeouts():
+    return (
+        float(get_setting("SANDBOX_CONNECT_TIMEOUT", DEFAULT_CONNECT_TIMEOUT)),
+        float(get_setting("SANDBOX_READ_TIMEOUT", DEFAULT_READ_TIMEOUT)),
+    )
+
+
+def request(method: str, path: str, *, json=None, idempotent: bool = False) -> dict:
+    """Вызов API sandbox-manager, возвращает разобранный JSON.
+
+    idempotent=True разрешает до SANDBOX_RETRIES повторов при ошибке
+    соединения. Таймаут чтения и 502/503/504 повторяются только для GET:
+    медленную проверку флага повторять нельзя — запрос, ждущий песочницу,
+    держал бы воркер в разы дольше таймаута чтения.
+    """
+    url = f"{get_setting('SANDBOX_BASE', '').rstrip('/')}{path}"
+    headers = {"X-Api-Key": get_setting("SANDBOX_API_KEY", "")}
+    retries = int(get_setting("SANDBOX_RETRIES", DEFAULT_RETRIES)) if idempotent else 0
+    timeout = _timeouts()
+
+    attempt = 0
+    while True:
+        attempt += 1
+        breaker.before_call()
+        started = time.perf_counter()
+        try:
+            r = get_session().request(method, url, json=json, headers=headers, timeout=timeout)
+            elapsed = (time.perf_counter() - started) * 1000
+            current_app.logger.info("sandbox %s %s -> %s in %.1f ms (attempt %d)", method, path, r.status_code, elapsed, attempt)
+            # 4xx — ошибка запроса, а не падение менеджера: предохранитель её не считает
+            if r.status_code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            if r.status_code in RETRY_STATUSES and method == "GET" and attempt <= retries:
+                raise requests.HTTPError(f"{r.status_code} from sandbox", response=r)
+            r.raise_for_status()
+            return r.json()
+        except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as e:
+            elapsed = (time.perf_counter() - started) * 1000
+            is_http = isinstance(e, requests.HTTPError)
+            if not is_http:
+                breaker.record_failure()
+            # ConnectTimeout — подкласс ConnectionError, ReadTimeout — нет
+            retryable = isinstance(e, requests.ConnectionError) or (
+                method == "GET" and (not is_http or e.response.status_code in RETRY_STATUSES)
+            )
+            if retryable and attempt <= retries:
+                current_app.logger.warning("sandbox %s %s failed in %.1f ms, retrying: %s", method, path, elapsed, e)
+                time.sleep(0.1 * 2 ** (attempt - 1))
+                continue
+            current_app.logger.warning("sandbox %s %s failed in %.1f ms: %s", method, path, elapsed, e)
+            raise SandboxError(str(e)) from e
+        except ValueError as e:
+            raise SandboxError("sandbox returned invalid JSON") from e
+        except requests.RequestException as e:
+            breaker.record_failure()
+            raise SandboxError(str(e)) from e
+
+
+def create_session(lab_slug: str, user_id) -> dict:
+    """Поднять окружение лабы. Не идемпотентно — без повторов."""
+    return request("POST", "/api/v1/sessions", json={"lab_slug": lab_slug, "user_id": user_id})
+
+
+def verify_flag(lab_slug: str, flag: str, user_id) -> dict:
+    """Проверить флаг на стороне песочницы. Проверка ничего не меняет — можно повторять."""
+    return request("POST", "/api/v1/verify", json={"lab_slug": lab_slug, "flag": flag, "user_id": user_id},
+                   idempotent=True)
+
+
+def list_labs() -> list:
+    """Каталог лаб sandbox-manager: [{"slug", "title", "flag"}, ...]."""
+    data = request("GET", "/api/v1/labs", idempotent=True)
+    return data.get("labs", []) if isinstance(data, dict) else data
@@ -0,0 +1,8 @@
+import os
+
+from flask import current_app
+
+
+def get_setting(key: str, default=None):
+    """Значение из app.config; если app/config.py не знает ключ — из окружения."""
+    return current_app.config.get(key, os.getenv(key, default))
@@ -0,0 +1,114 @@
+"""Бенчмарк сжатия динамических ответов (app/services/compression.py).
+
+Запуск из корня репозитория:
+
+    python -m benchmarks.compression --students 200 --lessons 40 --requests 30 --mbps 10
+
+База заполняется тем же генератором, что и бенчмарк ведомости, лекциям
+добавляется HTML. Страницы курса (преподаватель и студент),
+список пользователей админки и кабинет запрашиваются тестовым клиентом
+без сжатия, с gzip и с br (если установлен brotli). Печатается размер
+ответа, время ответа приложения (со сжатием) и оценка полного времени
+с передачей по каналу ``--mbps`` мегабит в секунду.
+"""
+import argparse
+import random
+import statistics
+import time
+
+from app import create_app
+from app.config import Config
+from app.extensions import db
+from app.models.course import CourseLesson, LessonType
+from app.models.user import User
+from app.services import compression
+from app.services.lesson_html import set_lesson_html
+from benchmarks.gradebook import seed
+
+
+LECTURE = (
+    "<h2>Раздел {n}</h2>"
+    "<p>Уязвимость возникает, когда пользовательский ввод попадает в запрос без "
+    "экранирования. Ниже — пример запроса и разбор того, как его исправить.</p>"
+    "<pre><code>SELECT * FROM users WHERE login = '{n}' OR 1=1 --</code></pre>"
+    "<ul><li>параметризованные запросы</li><li>минимальные права учётной записи БД</li>"
+    "<li>журналирование ошибок без вывода пользователю</li></ul>"
+)
+
+
+def login(client, user_id):
+    with client.session_transaction() as session:
+        session["_user_id"] = str(user_id)
+        session["_fresh"] = True
+
+
+def measure(client, url, encoding, requests):
+    headers = {"Accept-Encoding": encoding} if encoding else {"Accept-Encoding": "identity"}
+    timings = []
+    size = 0
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = client.get(url, headers=headers)
+        timings.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200, (url, response.status_code)
+        size = len(response.data)
+        served = response.headers.get("Content-Encoding", "identity")
+    return size, statistics.median(timings), served
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=200)
+    parser.add_argument("--lessons", type=int, default=40)
+    parser.add_argument("--requests", type=int, default=30)
+    parser.add_argument("--mbps", type=float, default=10.0, help="Пропускная способность канала клиента.")
+    parser.add_argument("--db", default="sqlite://")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = args.db
+        BCRYPT_LOG_ROUNDS = 4
+
+    app = create_app(BenchConfig)
+    app.config["TESTING"] = True
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        course = seed(args.students, args.lessons, random.Random(args.seed))
+        for lesson in CourseLesson.query.filter_by(lesson_type=LessonType.lecture):
+            set_lesson_html(lesson, "".join(LECTURE.format(n=n) for n in range(12)))
+        admin = User(name="Админ", login="bench-admin", email="admin@bench.local", status="admin")
+        teacher = User(name="Преподаватель", login="bench-teacher", email="teacher@bench.local", status="teacher")
+        db.session.add_all([admin, teacher])
+        course.teachers.append(teacher)
+        db.session.commit()
+        student_id = course.students[0].id
+        pages = [
+            ("course (teacher)", f"/course/{course.id}", teacher.id),
+            ("course (student)", f"/course/{course.id}", student_id),
+            ("admin users", "/admin/users", admin.id),
+            ("account", "/account", student_id),
+        ]
+
+    encodings = [None, "gzip"] + (["br"] if compression.brotli is not None else [])
+    bytes_per_ms = args.mbps * 1_000_000 / 8 / 1000
+
+    print(f"students={args.students} lessons={args.lessons} requests={args.requests} "
+          f"link={args.mbps:g} Mbit/s brotli={'yes' if compression.brotli else 'no'}")
+    print(f"{'page':<18} {'encoding':<9} {'bytes':>9} {'ratio':>6} {'app ms':>8} {'+transfer ms':>13}")
+    for name, url, user_id in pages:
+        client = app.test_client()
+        login(client, user_id)
+        client.get(url)  # прогрев кешей процесса
+        plain = None
+        for encoding in encodings:
+            size, app_ms, served = measure(client, url, encoding, args.requests)
+            plain = plain or size
+            total = app_ms + size / bytes_per_ms
+            print(f"{name:<18} {served:<9} {size:>9} {size / plain:>6.2f} {app_ms:>8.2f} {total:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""Бенчмарк ведомости курса: старый расчёт по студенту против сгруппированного.
+
+Запуск из корня репозитория:
+
+    python -m benchmarks.gradebook --students 10 50 100 300 --lessons 40
+
+По умолчанию используется SQLite в памяти; чтобы мерить на Postgres,
+передайте ``--db postgresql://...`` (база должна быть пустой).
+"""
+import argparse
+import random
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from app import create_app
+from app.config import Config
+from app.extensions import db
+from app.models.course import (
+    CourseModule, CourseLesson, LessonType,
+    TestAttempt, LabAttempt, StudentProgress,
+)
+from app.models.post import Post
+from app.models.user import User
+from app.services.gradebook import compute_course_gradebook
+
+
+def legacy_stats(course, student):
+    """Прежняя реализация compute_course_stats_for_student — эталон для сравнения."""
+    lessons_q = CourseLesson.query.join(CourseModule).filter(CourseModule.course_id == course.id)
+    lecture_ids = [l.id for l in lessons_q.filter(CourseLesson.lesson_type == LessonType.lecture).all()]
+    test_ids = [l.id for l in lessons_q.filter(CourseLesson.lesson_type == LessonType.test).all()]
+    lab_ids = [l.id for l in lessons_q.filter(CourseLesson.lesson_type == LessonType.lab).all()]
+
+    lectures_done = 0
+    if lecture_ids:
+        lectures_done = StudentProgress.query.filter(
+            StudentProgress.student_id == student.id,
+            StudentProgress.course_id == course.id,
+            StudentProgress.completed.is_(True),
+            StudentProgress.lesson_id.in_(lecture_ids),
+        ).count()
+
+    test_quality_ratio = 1.0
+    if test_ids:
+        best_ratios = []
+        for lid in test_ids:
+            attempts = TestAttempt.query.filter_by(student_id=student.id, lesson_id=lid).all()
+            if not attempts:
+                best_ratios.append(0.0)
+                continue
+            best_ratios.append(max(a.score / a.total if a.total else 0.0 for a in attempts))
+        test_quality_ratio = sum(best_ratios) / len(best_ratios)
+
+    labs_solved = 0
+    lab_attempts_total = 0
+    for lid in lab_ids:
+        attempts_q = LabAttempt.query.filter_by(student_id=student.id, lesson_id=lid)
+        lab_attempts_total += attempts_q.count()
+        if attempts_q.filter_by(is_correct=True).first() is not None:
+            labs_solved += 1
+
+    lectures_ratio = lectures_done / len(lecture_ids) if lecture_ids else 1.0
+    labs_ratio = labs_solved / len(lab_ids) if lab_ids else 1.0
+    return {
+        "lectures_done": lectures_done,
+        "tests_ratio": test_quality_ratio,
+        "labs_solved": labs_solved,
+        "lab_attempts_total": lab_attempts_total,
+        "final_score": round((lectures_ratio + test_quality_ratio + labs_ratio) / 3 * 10, 1),
+    }
+
+
+@contextmanager
+def count_queries():
+    counter = {"n": 0}
+
+    def _before(*args, **kwargs):
+        counter["n"] += 1
+
+    event.listen(db.engine, "before_cursor_execute", _before)
+    try:
+        yield counter
+    finally:
+        event.remove(db.engine, "before_cursor_execute", _before)
+
+
+def seed(n_students, n_lessons, rnd):
+    course = Post(name="Bench", bio="bench", exp="1", level="junior")
+    db.session.add(course)
+    db.session.flush()
+
+    lessons = []
+    per_module = 10
+    for m_idx in range(0, n_lessons, per_module):
+        module = CourseModule(course_id=course.id, title=f"M{m_idx}", order=m_idx // per_module + 1)
+        db.session.add(module)
+        db.session.flush()
+        for i in range(min(per_module, n_lessons - m_idx)):
+            lesson_type = ("lecture", "test", "lab")[(m_idx + i) % 3]
+            lesson = CourseLesson(module_id=module.id, title=f"L{m_idx + i}", order=i + 1,
+                                  lesson_type=lesson_type)
+            db.session.add(lesson)
+            lessons.append(lesson)
+    db.session.flush()
+
+    students = [User(name=f"s{i}", login=f"s{i}", email=f"s{i}@bench.local", status="student")
+                for i in range(n_students)]
+    db.session.add_all(students)
+    db.session.flush()
+    course.students.extend(students)
+
+    for s in students:
+        for lesson in lessons:
+            if lesson.lesson_type == "lecture" and rnd.random() < 0.7:
+                db.session.add(StudentProgress(student_id=s.id, course_id=course.id,
+                                               lesson_id=lesson.id, completed=True))
+            elif lesson.lesson_type == "test":
+                for _ in range(rnd.randint(0, 3)):
+                    total = rnd.choice([0, 5, 7, 10])
+                    db.session.add(TestAttempt(student_id=s.id, lesson_id=lesson.id,
+                                               score=rnd.randint(0, total), total=total))
+            elif lesson.lesson_type == "lab":
+                for _ in range(rnd.randint(0, 4)):
+                    db.session.add(LabAttempt(student_id=s.id, lesson_id=lesson.id,
+                                              submitted_flag="FLAG{x}", is_correct=rnd.random() < 0.3))
+    db.session.commit()
+    return course
+
+
+def bench(n_students, n_lessons, seed_value):
+    db.drop_all()
+    db.create_all()
+    course = seed(n_students, n_lessons, random.Random(seed_value))
+    students = course.students
+
+    with count_queries() as legacy_q:
+        t0 = time.perf_counter()
+        legacy = {s.id: legacy_stats(course, s) for s in students}
+        legacy_t = time.perf_counter() - t0
+
+    with count_queries() as new_q:
+        t0 = time.perf_counter()
+        fresh = compute_course_gradebook(course.id, [s.id for s in students])
+        new_t = time.perf_counter() - t0
+
+    for sid, old in legacy.items():
+        for key, value in old.items():
+            if fresh[sid][key] != value:
+                raise SystemExit(f"mismatch for student {sid}: {key} {value!r} != {fresh[sid][key]!r}")
+
+    print(f"{n_students:>8} {legacy_q['n']:>10} {legacy_t * 1000:>10.1f} {new_q['n']:>10} {new_t * 1000:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, nargs="+", default=[10, 50, 100, 300])
+    parser.add_argument("--lessons", type=int, default=40)
+    parser.add_argument("--db", default="sqlite://")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = args.db
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        print(f"{'students':>8} {'old q':>10} {'old ms':>10} {'new q':>10} {'new ms':>10}")
+        for n in args.students:
+            bench(n, args.lessons, args.seed)
+        db.drop_all()
+
+
+if __name__ == "__main__":
+    main()
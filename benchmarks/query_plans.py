@@ -0,0 +1,60 @@
+"""Регрессионная проверка индексов: EXPLAIN ключевых запросов на заполненной базе.
+
+Запуск из корня репозитория:
+
+    python -m benchmarks.query_plans --students 200 --lessons 40
+
+Схема создаётся по моделям, база заполняется тем же генератором, что и
+бенчмарк ведомости, затем каждый ключевой запрос проверяется через
+app.services.query_plans. Код выхода 1, если хоть один запрос читает
+таблицу целиком. Для Postgres передайте ``--db postgresql://...``
+(база должна быть пустой). На рабочей базе то же делает ``flask schema explain``.
+"""
+import argparse
+import random
+import sys
+
+from sqlalchemy import text
+
+from app import create_app
+from app.config import Config
+from app.extensions import db
+from app.services.query_plans import check_plans
+from benchmarks.gradebook import seed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=200)
+    parser.add_argument("--lessons", type=int, default=40)
+    parser.add_argument("--db", default="sqlite://")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = args.db
+
+    app = create_app(BenchConfig)
+    failed = 0
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed(args.students, args.lessons, random.Random(args.seed))
+        db.session.execute(text("ANALYZE"))
+        db.session.commit()
+
+        for result in check_plans():
+            ok = not result.seq_scans
+            print(f"{'ok  ' if ok else 'FAIL'} {result.name}")
+            for line in result.plan:
+                print(f"       {line}")
+            failed += not ok
+        db.drop_all()
+
+    if failed:
+        print(f"{failed} queries fall back to sequential scans")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
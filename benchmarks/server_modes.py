@@ -0,0 +1,256 @@
+"""Бенчмарк моделей воркеров gunicorn (sync / gthread / gevent) на нашей нагрузке.
+
+Запуск из корня репозитория (нужен установленный gunicorn, для gevent — gevent):
+
+    python -m benchmarks.server_modes --modes sync gthread gevent --clients 16 --duration 15
+
+Поднимается поддельный sandbox-manager с задержкой ответа
+(``--sandbox-latency``), база заполняется курсом и студентами, затем для
+каждого режима запускается gunicorn с app/gunicorn_conf.py. Клиенты,
+залогиненные студентами, открывают страницу курса и лекции, а доля
+``--lab-share`` запросов — отправка флага через sandbox, то есть медленный
+внешний вызов. Печатается пропускная способность и задержки страниц:
+в sync-режиме они растут вместе с задержкой sandbox, в gthread/gevent — нет.
+
+По умолчанию используется файл SQLite; для Postgres передайте
+``--db postgresql://...`` (база должна быть пустой).
+"""
+import argparse
+import json
+import os
+import random
+import signal
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from app import create_app
+from app.config import Config
+from app.extensions import db
+from app.models.course import CourseModule, CourseLesson, LessonType, LabDefinition
+from app.models.post import Post
+from app.models.user import User
+
+
+PASSWORD = "benchpass1"
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = os.getenv("BENCH_DB", "sqlite:////tmp/bench_server_modes.db")
+    SANDBOX_BASE = os.getenv("BENCH_SANDBOX", "http://127.0.0.1:9")
+    # стоимость bcrypt здесь не предмет измерения
+    BCRYPT_LOG_ROUNDS = 4
+
+
+def make_app():
+    """Фабрика для gunicorn: ``benchmarks.server_modes:make_app()``."""
+    return create_app(BenchConfig)
+
+
+def start_fake_sandbox(latency: float) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            time.sleep(latency)
+            body = json.dumps({"ok": False, "message": "Флаг неверный"}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def seed(students: int) -> dict:
+    db.drop_all()
+    db.create_all()
+
+    course = Post(name="Bench course", bio="bench", exp="1", level="base")
+    db.session.add(course)
+    db.session.flush()
+
+    lecture_id = lab_id = None
+    for m in range(5):
+        module = CourseModule(course_id=course.id, title=f"Модуль {m + 1}", order=m + 1)
+        db.session.add(module)
+        db.session.flush()
+        for i in range(6):
+            kind = LessonType.lab if i == 5 else LessonType.lecture
+            lesson = CourseLesson(
+                module_id=module.id, title=f"Урок {m + 1}.{i + 1}", order=i + 1,
+                lesson_type=kind, html_content="<p>" + "текст лекции " * 200 + "</p>",
+                sandbox_slug="bench" if kind == LessonType.lab else None,
+            )
+            db.session.add(lesson)
+            db.session.flush()
+            if kind == LessonType.lab:
+                lab_id = lab_id or lesson.id
+            else:
+                lecture_id = lecture_id or lesson.id
+
+    db.session.add(LabDefinition(slug="bench", title="Bench", correct_flag="FLAG{bench}"))
+
+    logins = []
+    for n in range(students):
+        user = User(name=f"Студент {n}", login=f"bench{n}", email=f"bench{n}@example.com", status="student")
+        user.set_password(PASSWORD)
+        db.session.add(user)
+        course.students.append(user)
+        logins.append(user.login)
+
+    db.session.commit()
+    return {"course": course.id, "lecture": lecture_id, "lab": lab_id, "logins": logins}
+
+
+def wait_ready(base: str, proc: subprocess.Popen, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("gunicorn exited during startup")
+        try:
+            requests.get(f"{base}/login", timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError("gunicorn did not start in time")
+
+
+def run_clients(base: str, data: dict, clients: int, duration: float, lab_share: float) -> dict:
+    urls = {
+        "course": f"{base}/course/{data['course']}",
+        "lecture": f"{base}/course/{data['course']}/lesson/{data['lecture']}",
+        "lab": f"{base}/sandbox/verify/{data['course']}/{data['lab']}",
+    }
+    latencies = {kind: [] for kind in urls}
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client(login):
+        session = requests.Session()
+        session.post(f"{base}/login", data={"login": login, "password": PASSWORD}, timeout=30)
+        rnd = random.Random(login)
+        while time.monotonic() < deadline:
+            roll = rnd.random()
+            kind = "lab" if roll < lab_share else ("course" if roll < 0.6 else "lecture")
+            started = time.perf_counter()
+            try:
+                if kind == "lab":
+                    r = session.post(urls[kind], data={"flag": "FLAG{nope}"}, allow_redirects=False, timeout=30)
+                else:
+                    r = session.get(urls[kind], timeout=30)
+                ok = r.status_code < 400
+            except requests.RequestException:
+                ok = False
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                if ok:
+                    latencies[kind].append(elapsed)
+                else:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=client, args=(login,)) for login in data["logins"][:clients]]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    return {"latencies": latencies, "errors": errors[0]}
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+
+def bench_mode(mode: str, args, data: dict, sandbox_url: str) -> None:
+    if mode == "gevent":
+        try:
+            import gevent  # noqa: F401
+        except ImportError:
+            print(f"{mode:>8}  skipped: gevent is not installed")
+            return
+
+    port = args.port
+    env = dict(
+        os.environ,
+        GUNICORN_WORKER_CLASS=mode,
+        GUNICORN_WORKERS=str(args.workers),
+        GUNICORN_THREADS=str(args.threads),
+        GUNICORN_ACCESSLOG="/dev/null",
+        GUNICORN_LOGLEVEL="warning",
+        BENCH_DB=args.db,
+        BENCH_SANDBOX=sandbox_url,
+    )
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", os.path.join(ROOT, "app", "gunicorn_conf.py"),
+         "--bind", f"127.0.0.1:{port}", "benchmarks.server_modes:make_app()"],
+        cwd=ROOT, env=env,
+    )
+    base = f"http://127.0.0.1:{port}"
+    try:
+        wait_ready(base, proc)
+        result = run_clients(base, data, args.clients, args.duration, args.lab_share)
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=60)
+
+    lat = result["latencies"]
+    pages = lat["course"] + lat["lecture"]
+    total = sum(len(v) for v in lat.values())
+    print(
+        f"{mode:>8}  {total / args.duration:8.1f} req/s"
+        f"  pages p50 {statistics.median(pages) if pages else 0:7.1f} ms"
+        f"  p95 {percentile(pages, 0.95):7.1f} ms"
+        f"  lab p95 {percentile(lat['lab'], 0.95):7.1f} ms"
+        f"  errors {result['errors']}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modes", nargs="+", default=["sync", "gthread", "gevent"])
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--sandbox-latency", type=float, default=0.3)
+    parser.add_argument("--lab-share", type=float, default=0.1)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--db", default="sqlite:////tmp/bench_server_modes.db")
+    args = parser.parse_args()
+
+    sandbox = start_fake_sandbox(args.sandbox_latency)
+    sandbox_url = f"http://127.0.0.1:{sandbox.server_port}"
+
+    os.environ["BENCH_DB"] = args.db
+    BenchConfig.SQLALCHEMY_DATABASE_URI = args.db
+    app = make_app()
+    with app.app_context():
+        data = seed(args.clients)
+        db.engine.dispose()
+
+    print(f"workers={args.workers} threads={args.threads} clients={args.clients} "
+          f"sandbox latency={args.sandbox_latency * 1000:.0f} ms lab share={args.lab_share:.0%}")
+    for mode in args.modes:
+        bench_mode(mode, args, data, sandbox_url)
+
+    sandbox.shutdown()
+
+
+if __name__ == "__main__":
+    main()
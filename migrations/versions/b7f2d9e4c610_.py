@@ -0,0 +1,52 @@
+"""index pack for attempts, progress and course structure
+
+Revision ID: b7f2d9e4c610
+Revises: c8e15f3a7d42
+Create Date: 2026-10-18 21:02:45.310276
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7f2d9e4c610'
+down_revision = 'c8e15f3a7d42'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_test_attempt_student_lesson', 'test_attempt', ['student_id', 'lesson_id'], False),
+    ('ix_lab_attempt_student_lesson_correct', 'lab_attempt', ['student_id', 'lesson_id', 'is_correct'], False),
+    ('uq_student_progress_student_course_lesson', 'student_progress', ['student_id', 'course_id', 'lesson_id'], True),
+    ('ix_course_lesson_module_order', 'course_lesson', ['module_id', 'order'], False),
+    ('ix_course_module_course_order', 'course_module', ['course_id', 'order'], False),
+    ('ix_user_course_course_id', 'user_course', ['course_id'], False),
+]
+
+
+def upgrade():
+    # до уникального индекса убираем дубликаты прогресса: оставляем завершённую
+    # строку, при равенстве — самую раннюю
+    op.execute(
+        "DELETE FROM student_progress WHERE EXISTS ("
+        " SELECT 1 FROM student_progress AS other"
+        " WHERE other.student_id = student_progress.student_id"
+        " AND other.course_id = student_progress.course_id"
+        " AND other.lesson_id = student_progress.lesson_id"
+        " AND (other.completed > student_progress.completed"
+        "  OR (other.completed = student_progress.completed AND other.id < student_progress.id)))"
+    )
+
+    # CREATE INDEX CONCURRENTLY не работает внутри транзакции и не блокирует запись в таблицу
+    with op.get_context().autocommit_block():
+        for name, table, columns, unique in INDEXES:
+            op.create_index(name, table, columns, unique=unique,
+                            postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns, unique in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,38 @@
+"""indexes for keyset pagination of users and courses
+
+Revision ID: d3a8c51f7e29
+Revises: b7f2d9e4c610
+Create Date: 2026-10-18 21:40:12.774031
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3a8c51f7e29'
+down_revision = 'b7f2d9e4c610'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_post_created_id', 'post', ['created_at', 'id']),
+    ('ix_user_status_id', 'user', ['status', 'id']),
+]
+
+
+def upgrade():
+    # курсор по created_at не умеет NULL — у старых курсов дату берём «сейчас»
+    op.execute("UPDATE post SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL")
+
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False,
+                            postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,35 @@
+"""Регрессии очистки HTML лекций (services/lesson_html.py).
+
+Запуск из корня репозитория: python -m unittest tests.test_lesson_html
+"""
+import unittest
+
+from app.services.lesson_html import DEFAULT_IFRAME_HOSTS, _Renderer
+
+
+def render(source: str) -> str:
+    return _Renderer(set(DEFAULT_IFRAME_HOSTS), "/static").render(source)
+
+
+class DroppedTagsTest(unittest.TestCase):
+    def test_embed_does_not_swallow_rest_of_lecture(self):
+        self.assertEqual(
+            render('<p>intro</p><embed src="/static/x.pdf"><p>rest of lecture</p>'),
+            "<p>intro</p><p>rest of lecture</p>",
+        )
+
+    def test_self_closing_embed(self):
+        self.assertEqual(render('<p>a</p><embed src="/x.pdf"/><p>b</p>'), "<p>a</p><p>b</p>")
+
+    def test_self_closing_svg(self):
+        self.assertEqual(render("<p>a</p><svg/><p>b</p>"), "<p>a</p><p>b</p>")
+
+    def test_svg_dropped_with_content(self):
+        self.assertEqual(render("<p>a</p><svg><text>x</text></svg><p>b</p>"), "<p>a</p><p>b</p>")
+
+    def test_script_dropped_with_content(self):
+        self.assertEqual(render("<p>a</p><script>alert(1)</script><p>b</p>"), "<p>a</p><p>b</p>")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+"""Регрессия индексов: ни один ключевой запрос не читает таблицу целиком.
+
+Запуск из корня репозитория: python -m unittest tests.test_query_plans
+"""
+import random
+import unittest
+
+from sqlalchemy import text
+
+from app import create_app
+from app.config import Config
+from app.extensions import db
+from app.services.query_plans import check_plans
+from benchmarks.gradebook import seed
+
+
+class PlansConfig(Config):
+    SQLALCHEMY_DATABASE_URI = "sqlite://"
+
+
+class QueryPlansTest(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app(PlansConfig)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        seed(20, 6, random.Random(42))
+        db.session.execute(text("ANALYZE"))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_key_queries_use_indexes(self):
+        results = check_plans()
+        self.assertTrue(results)
+        for result in results:
+            with self.subTest(result.name):
+                self.assertEqual(result.seq_scans, [], "\n".join(result.plan))
+
+
+if __name__ == "__main__":
+    unittest.main()